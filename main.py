@@ -19,34 +19,206 @@ Funcionalidades principais:
 """
 
 import argparse
+import asyncio
+import atexit
+import copy
 import datetime
+import functools
+import io
 import json
 import logging
+import logging.handlers
+import math
 import os
+import queue
 import shutil
+import sqlite3
 import sys
+import tempfile
+import threading
 import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import closing
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
 import boto3
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from botocore.config import Config as BotoConfig
 from botocore.exceptions import BotoCoreError, ClientError
 from dotenv import load_dotenv
 from kaggle.api.kaggle_api_extended import KaggleApi
 
 # ==================== CONFIGURAÇÃO DE LOGGING ====================
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler('cdc_pipeline.log', encoding='utf-8')
-    ]
-)
 logger = logging.getLogger(__name__)
 
+# Formato legível usado no console
+LOG_FORMAT = '%(asctime)s - %(name)s - [%(threadName)s] - %(levelname)s - %(message)s'
+
+# Padrões de 'logging' no config.json
+DEFAULT_LOGGING_CONFIG = {
+    "level": "INFO",
+    "file": "cdc_pipeline.log",
+    "max_bytes": 10 * 1024 * 1024,
+    "backup_count": 5,
+    "debug_per_second": 20
+}
+
+# Listener ativo (ver setup_logging)
+_log_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class JsonLineFormatter(logging.Formatter):
+    """
+    Formata cada registro de log como uma linha JSON.
+    """
+    
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage()
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler que preserva a exceção separada da mensagem.
+    
+    O padrão do QueueHandler concatena o traceback à mensagem; aqui só a
+    mensagem é interpolada na thread de origem e o traceback vai em exc_text,
+    para o JsonLineFormatter gravá-lo em um campo próprio.
+    """
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class _DebugRateLimitFilter(logging.Filter):
+    """
+    Limita os registros DEBUG de cada ponto do código a N por segundo.
+    
+    Laços por arquivo (limpeza, reaplicação de CDC, partições) emitem uma
+    linha por iteração; acima do limite os registros são descartados antes
+    de entrar na fila, e o próximo registro aceito do mesmo ponto informa
+    quantos foram suprimidos. Níveis acima de DEBUG nunca são limitados.
+    """
+    
+    def __init__(self, per_second: int):
+        super().__init__()
+        self.per_second = per_second
+        self._lock = threading.Lock()
+        # (arquivo, linha) -> [início da janela, aceitos, suprimidos]
+        self._windows: Dict[Tuple[str, int], List] = {}
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG:
+            return True
+        
+        site = (record.pathname, record.lineno)
+        with self._lock:
+            window = self._windows.setdefault(site, [record.created, 0, 0])
+            if record.created - window[0] >= 1.0:
+                window[0], window[1] = record.created, 0
+            if window[1] >= self.per_second:
+                window[2] += 1
+                return False
+            window[1] += 1
+            suppressed, window[2] = window[2], 0
+        
+        if suppressed:
+            record.msg = f"{record.msg} (+{suppressed} suprimidos)"
+        return True
+
+
+def setup_logging(log_config: Optional[Dict] = None) -> logging.handlers.QueueListener:
+    """
+    Configura o logging sem bloquear as threads do pipeline.
+    
+    Os registros entram em uma fila (QueueHandler) e uma thread dedicada
+    (QueueListener) os grava no console, em texto, e em um arquivo JSON lines
+    com rotação por tamanho. Registros DEBUG de um mesmo ponto do código são
+    limitados a 'debug_per_second' (ver _DebugRateLimitFilter). Chamadas
+    repetidas substituem a configuração anterior.
+    
+    Args:
+        log_config: Seção 'logging' do config.json (level, file, max_bytes,
+            backup_count, debug_per_second); chaves ausentes usam
+            DEFAULT_LOGGING_CONFIG
+            
+    Returns:
+        QueueListener em execução
+    """
+    global _log_listener
+    
+    options = {**DEFAULT_LOGGING_CONFIG, **(log_config or {})}
+    root = logging.getLogger()
+    
+    shutdown_logging()
+    for handler in [h for h in root.handlers if isinstance(h, logging.handlers.QueueHandler)]:
+        root.removeHandler(handler)
+    
+    console = logging.StreamHandler(sys.stdout)
+    console.setFormatter(logging.Formatter(LOG_FORMAT))
+    handlers = [console]
+    
+    if options["file"]:
+        log_file = logging.handlers.RotatingFileHandler(
+            options["file"],
+            maxBytes=options["max_bytes"],
+            backupCount=options["backup_count"],
+            encoding="utf-8"
+        )
+        log_file.setFormatter(JsonLineFormatter())
+        handlers.append(log_file)
+    
+    log_queue = queue.SimpleQueue()
+    queue_handler = _QueueHandler(log_queue)
+    if options["debug_per_second"]:
+        queue_handler.addFilter(_DebugRateLimitFilter(options["debug_per_second"]))
+    root.addHandler(queue_handler)
+    
+    level = options["level"]
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+    
+    _log_listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _log_listener.start()
+    return _log_listener
+
+
+def shutdown_logging():
+    """
+    Esvazia a fila de log e encerra o listener (registrada com atexit).
+    """
+    global _log_listener
+    
+    if _log_listener is not None:
+        _log_listener.stop()
+        for handler in _log_listener.handlers:
+            handler.close()
+        _log_listener = None
+
+
+atexit.register(shutdown_logging)
+
 # ==================== CONFIGURAÇÃO GLOBAL ====================
 
 # Carrega variáveis de ambiente
@@ -62,10 +234,14 @@ AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
 AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
 AWS_SESSION_TOKEN = os.getenv("AWS_SESSION_TOKEN")  # Opcional
 
-# Diretórios locais
-DIR_ACTUAL = Path("./data/actual")
-DIR_LAST = Path("./data/last")
-DIR_CDC = Path("./data/cdc")
+# Diretório local de dados (padrão para configurações sem 'data_dir')
+DIR_DATA = Path("./data")
+
+# Ponteiros de snapshot (current/last), relativos ao diretório de dados.
+# Os valores padrão correspondem ao layout original ./data/actual e ./data/last.
+# A chave opcional 'held' guarda, por tabela, o snapshot base retido após um erro.
+SNAPSHOT_POINTERS_FILE = "pointers.json"
+DEFAULT_SNAPSHOT_POINTERS = {"current": "actual", "last": "last"}
 
 # ==================== FUNÇÕES DE CONFIGURAÇÃO ====================
 
@@ -106,17 +282,33 @@ def validate_config(config: Dict) -> bool:
     Returns:
         True se válido, False caso contrário
     """
-    required_keys = ["dataset_name", "aws", "timer", "tables"]
+    required_keys = ["dataset_name", "aws", "tables"]
     aws_keys = ["bucket", "prefix", "region"]
     
-    for key in required_keys:
-        if key not in config:
-            logger.error(f"Chave obrigatória ausente no config.json: {key}")
-            return False
+    if "timer" not in config:
+        logger.error("Chave obrigatória ausente no config.json: timer")
+        return False
+    
+    datasets = expand_datasets(config)
+    
+    for dataset in datasets:
+        for key in required_keys:
+            if key not in dataset:
+                logger.error(f"Chave obrigatória ausente no dataset '{dataset['name']}': {key}")
+                return False
+        
+        for key in aws_keys:
+            if key not in dataset["aws"]:
+                logger.error(f"Chave obrigatória ausente em aws do dataset '{dataset['name']}': {key}")
+                return False
     
-    for key in aws_keys:
-        if key not in config["aws"]:
-            logger.error(f"Chave obrigatória ausente em aws: {key}")
+    # Cada dataset precisa de diretórios e destino S3 isolados
+    names = [d["name"] for d in datasets]
+    data_dirs = [str(get_data_dirs(d)["base"].resolve()) for d in datasets]
+    targets = [(d["aws"]["bucket"], d["aws"]["prefix"]) for d in datasets]
+    for label, values in (("name", names), ("data_dir", data_dirs), ("aws.bucket/prefix", targets)):
+        if len(set(values)) != len(values):
+            logger.error(f"Valores duplicados de {label} entre datasets: {values}")
             return False
     
     if not KAGGLE_USERNAME or not KAGGLE_KEY:
@@ -131,68 +323,313 @@ def validate_config(config: Dict) -> bool:
     return True
 
 
-def create_directories():
+def expand_datasets(config: Dict) -> List[Dict]:
+    """
+    Expande a configuração em uma lista de configurações por dataset.
+    
+    Sem a chave 'datasets', a configuração é tratada como um único dataset
+    (formato original, dados em ./data/). Com 'datasets', cada item herda as
+    chaves de nível superior (ex.: 'guardrail', 'cleanup') e pode
+    sobrescrevê-las; 'aws' é mesclado chave a chave, e o diretório de dados
+    padrão é ./data/<name>/.
+    
+    Args:
+        config: Dicionário de configuração
+        
+    Returns:
+        Lista de configurações, uma por dataset, no formato aceito por run_pipeline
+    """
+    if "datasets" not in config:
+        dataset = dict(config)
+        dataset.setdefault("name", config.get("dataset_name", "default"))
+        return [dataset]
+    
+    base = {k: v for k, v in config.items() if k != "datasets"}
+    datasets = []
+    
+    for entry in config["datasets"]:
+        dataset = {**base, **entry}
+        dataset["aws"] = {**base.get("aws", {}), **entry.get("aws", {})}
+        dataset.setdefault("name", entry.get("dataset_name", "default").replace("/", "_"))
+        dataset.setdefault("data_dir", str(Path("./data") / dataset["name"]))
+        datasets.append(dataset)
+    
+    return datasets
+
+
+def get_data_dirs(config: Dict) -> Dict[str, Path]:
+    """
+    Retorna os diretórios locais de um dataset.
+    
+    'actual' e 'last' são resolvidos a partir dos ponteiros de snapshot
+    (ver read_snapshot_pointers). Se 'base_snapshot' estiver na configuração,
+    'last' aponta para esse snapshot retido em vez do ponteiro e as bases
+    retidas por tabela ('held') são ignoradas.
+    
+    Args:
+        config: Configuração do dataset (usa as chaves opcionais 'data_dir' e 'base_snapshot')
+        
+    Returns:
+        Dicionário com os caminhos 'base', 'actual', 'last', 'cdc', 'snapshots',
+        'memory_stats' e 'catalog', além de 'held' ({tabela: caminho relativo})
+    """
+    base = Path(config.get("data_dir") or DIR_DATA)
+    pointers = read_snapshot_pointers(base)
+    
+    dirs = {
+        "base": base,
+        "actual": base / pointers["current"],
+        "last": base / pointers["last"],
+        "cdc": base / "cdc",
+        "snapshots": base / "snapshots",
+        "memory_stats": base / "memory_stats.json",
+        "catalog": base / "cdc_catalog.sqlite",
+        "held": pointers.get("held", {})
+    }
+    
+    if config.get("base_snapshot"):
+        dirs["last"] = dirs["snapshots"] / config["base_snapshot"]
+        dirs["held"] = {}
+    
+    return dirs
+
+
+def get_last_csv(dirs: Dict[str, Path], table_name: str) -> Path:
+    """
+    Retorna o CSV do snapshot anterior contra o qual a tabela é comparada.
+    
+    Normalmente é dirs['last']; uma tabela com base retida ('held', ver
+    update_snapshot_hold) continua comparada contra o último snapshot aceito.
+    """
+    held = dirs.get("held", {})
+    if table_name in held:
+        return dirs["base"] / held[table_name] / f"{table_name}.csv"
+    return dirs["last"] / f"{table_name}.csv"
+
+
+def read_snapshot_pointers(data_dir: Path) -> Dict[str, str]:
+    """
+    Lê os ponteiros 'current' e 'last' do diretório de dados.
+    
+    Args:
+        data_dir: Diretório de dados do dataset
+        
+    Returns:
+        Dicionário {'current': caminho, 'last': caminho}, relativos a data_dir,
+        mais 'held' quando alguma tabela tem base retida
+    """
+    pointers_path = data_dir / "snapshots" / SNAPSHOT_POINTERS_FILE
+    
+    try:
+        with open(pointers_path, "r", encoding="utf-8") as f:
+            return {**DEFAULT_SNAPSHOT_POINTERS, **json.load(f)}
+    except FileNotFoundError:
+        return dict(DEFAULT_SNAPSHOT_POINTERS)
+
+
+def write_snapshot_pointers(data_dir: Path, pointers: Dict[str, str]):
+    """
+    Grava os ponteiros de snapshot de forma atômica.
+    
+    O conteúdo é escrito em um arquivo temporário e trocado com os.replace,
+    que é atômico no mesmo sistema de arquivos (inclusive no Windows): um
+    crash deixa os ponteiros antigos ou os novos, nunca um estado parcial.
+    
+    Args:
+        data_dir: Diretório de dados do dataset
+        pointers: Dicionário {'current': caminho, 'last': caminho}
+    """
+    snapshots_dir = data_dir / "snapshots"
+    snapshots_dir.mkdir(parents=True, exist_ok=True)
+    pointers_path = snapshots_dir / SNAPSHOT_POINTERS_FILE
+    tmp_path = snapshots_dir / f"{SNAPSHOT_POINTERS_FILE}.tmp"
+    
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(pointers, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    
+    os.replace(tmp_path, pointers_path)
+    logger.debug("Ponteiros de snapshot atualizados: %s", pointers)
+
+
+def create_directories(dirs: Optional[Dict[str, Path]] = None):
     """
     Cria os diretórios necessários para o funcionamento do pipeline.
+    
+    Args:
+        dirs: Diretórios do dataset (ver get_data_dirs; padrão: ./data/)
     """
-    directories = [DIR_ACTUAL, DIR_LAST, DIR_CDC]
+    dirs = dirs or get_data_dirs({})
+    directories = [dirs["cdc"], dirs["snapshots"]]
     
     for directory in directories:
         directory.mkdir(parents=True, exist_ok=True)
-        logger.debug(f"Diretório garantido: {directory}")
+        logger.debug("Diretório garantido: %s", directory)
 
 
 # ==================== FUNÇÕES DE DOWNLOAD (KAGGLE) ====================
 
-def download_dataset(dataset_name: str) -> bool:
+def new_snapshot_dirs(dirs: Dict[str, Path]) -> Tuple[Path, Path]:
+    """
+    Reserva o nome de um novo snapshot versionado.
+    
+    Args:
+        dirs: Diretórios do dataset (ver get_data_dirs)
+        
+    Returns:
+        Tupla (snapshots/<run_id>/, snapshots/<run_id>.partial/)
+    """
+    run_id = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    snapshot_dir = dirs["snapshots"] / run_id
+    suffix = 1
+    while snapshot_dir.exists():
+        snapshot_dir = dirs["snapshots"] / f"{run_id}_{suffix}"
+        suffix += 1
+    return snapshot_dir, snapshot_dir.with_name(f"{snapshot_dir.name}.partial")
+
+
+def publish_snapshot(dirs: Dict[str, Path], snapshot_dir: Path, partial_dir: Path) -> None:
+    """
+    Renomeia o snapshot parcial para o definitivo e aponta 'current' para ele.
+    
+    Args:
+        dirs: Diretórios do dataset (ver get_data_dirs)
+        snapshot_dir: Diretório definitivo do snapshot
+        partial_dir: Diretório onde os arquivos foram baixados
+    """
+    os.replace(partial_dir, snapshot_dir)
+    pointers = read_snapshot_pointers(dirs["base"])
+    pointers["current"] = snapshot_dir.relative_to(dirs["base"]).as_posix()
+    write_snapshot_pointers(dirs["base"], pointers)
+
+
+def get_snapshot_path(dirs: Dict[str, Path]) -> Optional[Path]:
+    """
+    Retorna o snapshot versionado representado por dirs['actual'].
+    
+    No pipeline assíncrono 'actual' ainda é o diretório .partial, que será
+    publicado sem o sufixo. Instalações sem snapshots versionados (data/actual)
+    retornam None.
+    """
+    actual = dirs["actual"]
+    if actual.parent != dirs["snapshots"]:
+        return None
+    if actual.name.endswith(".partial"):
+        return actual.with_name(actual.name[:-len(".partial")])
+    return actual
+
+
+def get_kaggle_api() -> KaggleApi:
+    """
+    Cria e autentica um cliente da API do Kaggle.
+    
+    Returns:
+        Cliente KaggleApi autenticado
+    """
+    # Configura credenciais do Kaggle
+    os.environ['KAGGLE_USERNAME'] = KAGGLE_USERNAME
+    os.environ['KAGGLE_KEY'] = KAGGLE_KEY
+    
+    api = KaggleApi()
+    api.authenticate()
+    return api
+
+
+def download_dataset(dataset_name: str, dirs: Optional[Dict[str, Path]] = None) -> bool:
     """
-    Faz o download do dataset do Kaggle para o diretório ./data/actual/.
+    Faz o download do dataset do Kaggle para um novo snapshot versionado.
+    
+    Os arquivos são baixados em snapshots/<run_id>.partial/, renomeados para
+    snapshots/<run_id>/ ao final e só então o ponteiro 'current' passa a
+    apontar para eles. Snapshots anteriores não são tocados.
     
     Args:
         dataset_name: Nome do dataset no formato 'usuario/nome-dataset'
+        dirs: Diretórios do dataset (ver get_data_dirs; padrão: ./data/)
         
     Returns:
         True se o download foi bem-sucedido, False caso contrário
     """
+    dirs = dirs or get_data_dirs({})
+    snapshot_dir, partial_dir = new_snapshot_dirs(dirs)
+    
     try:
         logger.info(f"Iniciando download do dataset: {dataset_name}")
         
-        # Configura credenciais do Kaggle
-        os.environ['KAGGLE_USERNAME'] = KAGGLE_USERNAME
-        os.environ['KAGGLE_KEY'] = KAGGLE_KEY
-        
-        # Inicializa API do Kaggle
-        api = KaggleApi()
-        api.authenticate()
-        
-        # Limpa diretório atual se existir
-        if DIR_ACTUAL.exists():
-            shutil.rmtree(DIR_ACTUAL)
-            logger.debug(f"Diretório {DIR_ACTUAL} limpo")
-        
-        DIR_ACTUAL.mkdir(parents=True, exist_ok=True)
+        api = get_kaggle_api()
+        partial_dir.mkdir(parents=True, exist_ok=True)
         
         # Faz o download e descompacta
         api.dataset_download_files(
             dataset_name,
-            path=str(DIR_ACTUAL),
+            path=str(partial_dir),
             unzip=True
         )
         
-        logger.info(f"Download concluído: {dataset_name}")
+        # Publica o snapshot e aponta 'current' para ele
+        publish_snapshot(dirs, snapshot_dir, partial_dir)
+        
+        logger.info(f"Download concluído: {dataset_name} (snapshot {snapshot_dir.name})")
         return True
         
     except Exception as e:
         logger.error(f"Erro ao baixar dataset {dataset_name}: {e}", exc_info=True)
+        shutil.rmtree(partial_dir, ignore_errors=True)
+        return False
+
+
+def download_table_file(api: KaggleApi, dataset_name: str, file_name: str, dest: Path) -> bool:
+    """
+    Baixa um único arquivo do dataset do Kaggle.
+    
+    A API pode entregar o arquivo compactado; nesse caso ele é extraído
+    em 'dest' e o .zip é removido.
+    
+    Args:
+        api: Cliente KaggleApi autenticado
+        dataset_name: Nome do dataset no formato 'usuario/nome-dataset'
+        file_name: Nome do arquivo dentro do dataset (ex.: 'clientes.csv')
+        dest: Diretório de destino
+        
+    Returns:
+        True se o arquivo foi baixado, False caso contrário
+    """
+    try:
+        api.dataset_download_file(dataset_name, file_name, path=str(dest), quiet=True)
+        
+        zip_path = dest / f"{file_name}.zip"
+        if (dest / file_name).exists() and zipfile.is_zipfile(dest / file_name):
+            os.replace(dest / file_name, zip_path)
+        if zip_path.exists():
+            with zipfile.ZipFile(zip_path) as archive:
+                archive.extractall(dest)
+            zip_path.unlink()
+        
+        if not (dest / file_name).exists():
+            logger.error(f"Arquivo {file_name} não encontrado após o download de {dataset_name}")
+            return False
+        
+        logger.debug("Arquivo baixado: %s", dest / file_name)
+        return True
+        
+    except Exception as e:
+        logger.error(f"Erro ao baixar {file_name} de {dataset_name}: {e}", exc_info=True)
         return False
 
 
 # ==================== FUNÇÕES DE UPLOAD (S3) ====================
 
-def get_s3_client():
+def get_s3_client(max_pool_connections: Optional[int] = None):
     """
     Cria e retorna um cliente boto3 para S3.
     
+    O cliente é thread-safe e pode ser compartilhado entre datasets
+    processados em paralelo.
+    
+    Args:
+        max_pool_connections: Tamanho do pool de conexões HTTP (opcional)
+        
     Returns:
         Cliente boto3 S3
     """
@@ -206,6 +643,9 @@ def get_s3_client():
         if AWS_SESSION_TOKEN:
             session_kwargs['aws_session_token'] = AWS_SESSION_TOKEN
         
+        if max_pool_connections:
+            session_kwargs['config'] = BotoConfig(max_pool_connections=max_pool_connections)
+        
         s3_client = boto3.client('s3', **session_kwargs)
         logger.debug("Cliente S3 criado com sucesso")
         return s3_client
@@ -252,132 +692,689 @@ def upload_to_s3(
         return False
 
 
-# ==================== FUNÇÕES DE FULL-LOAD ====================
+# ==================== CONTROLE DE CONCORRÊNCIA ====================
 
-def process_full_load(config: Dict, s3_client=None) -> bool:
+# Fator padrão entre o tamanho do CSV em disco e o DataFrame em memória
+# (usado até que a razão real da tabela seja aprendida em uma execução)
+DEFAULT_MEMORY_EXPANSION_FACTOR = 5.0
+
+# Pico do diff em relação aos snapshots carregados (merge + cópias intermediárias)
+CDC_PEAK_FACTOR = 2.0
+
+# Peso da observação mais recente na média móvel da razão de expansão
+MEMORY_RATIO_SMOOTHING = 0.5
+
+_memory_stats_lock = threading.Lock()
+
+
+class MemoryBudget:
     """
-    Processa o full-load de todas as tabelas:
-    1. Lê CSV do diretório actual
-    2. Converte para Parquet
-    3. Faz upload para S3 em full-load/
+    Orçamento global de memória (MB) compartilhado entre as tabelas em processamento.
     
-    Args:
-        config: Dicionário de configuração
-        s3_client: Cliente S3 (opcional)
-        
-    Returns:
-        True se todos os uploads foram bem-sucedidos, False caso contrário
+    Cada tabela reserva sua estimativa antes de carregar os dados e libera ao
+    terminar; quem não cabe no orçamento aguarda. Uma reserva maior que o
+    orçamento inteiro só é admitida quando nada mais está reservado, para que
+    tabelas grandes não fiquem bloqueadas para sempre.
     """
-    logger.info("=" * 60)
-    logger.info("INICIANDO PROCESSO DE FULL-LOAD")
-    logger.info("=" * 60)
-    
-    if s3_client is None:
-        s3_client = get_s3_client()
-    
-    bucket = config["aws"]["bucket"]
-    prefix = config["aws"]["prefix"]
-    tables = config["tables"]
     
-    success = True
+    def __init__(self, limit_mb: Optional[float] = None):
+        """
+        Args:
+            limit_mb: Limite em MB (None = sem limite)
+        """
+        self.limit_mb = limit_mb
+        self.used_mb = 0.0
+        self._condition = threading.Condition()
     
-    for table in tables:
-        table_name = table["name"]
-        separator = table["sep"]
+    def acquire(self, mb: float, label: str = "") -> float:
+        """
+        Reserva memória, bloqueando até haver espaço no orçamento.
         
-        try:
-            # Caminho do CSV original
-            csv_path = DIR_ACTUAL / f"{table_name}.csv"
-            
-            if not csv_path.exists():
-                logger.warning(f"Arquivo não encontrado: {csv_path}")
-                success = False
-                continue
-            
-            logger.info(f"Processando full-load: {table_name}")
-            
-            # Lê CSV
-            df = pd.read_csv(csv_path, sep=separator)
-            logger.debug(f"CSV lido: {df.shape[0]} linhas, {df.shape[1]} colunas")
-            
-            # Adiciona coluna DtAtualizacao se não existir (para compatibilidade com PySpark)
-            if 'DtAtualizacao' not in df.columns:
-                df['DtAtualizacao'] = datetime.datetime.now()
-                logger.debug(f"Coluna DtAtualizacao adicionada em full-load de {table_name}")
-            
-            # Caminho temporário para Parquet
-            parquet_path = DIR_ACTUAL / f"{table_name}.parquet"
+        Args:
+            mb: Quantidade estimada em MB
+            label: Identificação usada nos logs (ex.: nome da tabela)
             
-            # Salva como Parquet
-            df.to_parquet(parquet_path, index=False, engine='pyarrow')
-            logger.debug(f"Parquet criado: {parquet_path}")
-            
-            # Chave S3 para full-load
-            s3_key = f"{prefix}/full-load/{table_name}/{table_name}.parquet"
-            
-            # Upload para S3
-            if not upload_to_s3(str(parquet_path), bucket, s3_key, s3_client):
-                success = False
-            
-            # Remove arquivo Parquet temporário
-            parquet_path.unlink()
-            logger.debug(f"Arquivo temporário removido: {parquet_path}")
-            
-        except Exception as e:
-            logger.error(f"Erro ao processar full-load de {table_name}: {e}", exc_info=True)
-            success = False
-    
-    if success:
-        logger.info("Full-load concluído com sucesso para todas as tabelas")
-    else:
-        logger.warning("Full-load concluído com alguns erros")
+        Returns:
+            Quantidade efetivamente reservada (0 se não houver limite)
+        """
+        if self.limit_mb is None:
+            return 0.0
+        
+        with self._condition:
+            if self.used_mb > 0 and self.used_mb + mb > self.limit_mb:
+                logger.info(
+                    f"Aguardando orçamento de memória para {label}: "
+                    f"{mb:.0f} MB (em uso: {self.used_mb:.0f}/{self.limit_mb:.0f} MB)"
+                )
+            while self.used_mb > 0 and self.used_mb + mb > self.limit_mb:
+                self._condition.wait()
+            self.used_mb += mb
+        
+        return mb
     
-    return success
-
+    def release(self, mb: float):
+        """
+        Libera uma reserva feita com acquire().
+        
+        Args:
+            mb: Quantidade retornada por acquire()
+        """
+        if not mb:
+            return
+        
+        with self._condition:
+            self.used_mb = max(self.used_mb - mb, 0.0)
+            self._condition.notify_all()
 
-# ==================== FUNÇÕES DE CDC ====================
 
-def get_insert_lines(df_last: pd.DataFrame, df_actual: pd.DataFrame, pk: str) -> pd.DataFrame:
+def estimate_memory_mb(paths: List[Path], expansion_factor: float) -> float:
     """
-    Identifica linhas inseridas (presentes no atual mas não no anterior).
+    Estima a memória necessária para carregar arquivos CSV em DataFrames.
     
     Args:
-        df_last: DataFrame do snapshot anterior
-        df_actual: DataFrame do snapshot atual
-        pk: Nome da coluna de chave primária
+        paths: Arquivos que serão carregados (inexistentes são ignorados)
+        expansion_factor: Razão memória/tamanho em disco
         
     Returns:
-        DataFrame com as linhas inseridas e coluna 'op' = 'I'
+        Estimativa em MB
     """
-    df_insert = df_actual[~df_actual[pk].isin(df_last[pk])].copy()
-    df_insert["op"] = "I"
-    logger.debug(f"Inserções detectadas: {len(df_insert)}")
-    return df_insert
+    total_bytes = sum(p.stat().st_size for p in paths if p.exists())
+    return total_bytes * expansion_factor / (1024 * 1024)
 
 
-def get_update_lines(
-    df_last: pd.DataFrame,
-    df_actual: pd.DataFrame,
-    pk: str,
-    date_field: str
-) -> pd.DataFrame:
+def get_memory_ratio(stats_path: Path, table_name: str, default: float) -> float:
     """
-    Identifica linhas atualizadas (PK existe em ambos e campo de data é maior no atual).
-    Se date_field for None ou vazio, compara todas as colunas por hash.
+    Retorna a razão de expansão (memória / tamanho do CSV) aprendida para a tabela.
     
     Args:
-        df_last: DataFrame do snapshot anterior
-        df_actual: DataFrame do snapshot atual
-        pk: Nome da coluna de chave primária
-        date_field: Nome do campo de data para comparação (pode ser None)
+        stats_path: Arquivo JSON com as razões registradas
+        table_name: Nome da tabela
+        default: Valor usado se a tabela ainda não tiver histórico
         
     Returns:
-        DataFrame com as linhas atualizadas e coluna 'op' = 'U'
+        Razão de expansão
     """
-    # Se não houver campo de data, compara todas as colunas por hash
-    if not date_field or date_field == "":
-        # Cria hash de todas as colunas (exceto PK)
-        cols_to_hash = [c for c in df_last.columns if c != pk]
+    with _memory_stats_lock:
+        try:
+            with open(stats_path, "r", encoding="utf-8") as f:
+                stats = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return default
+    
+    return stats.get(table_name, {}).get("expansion_ratio", default)
+
+
+def record_memory_ratio(stats_path: Path, table_name: str, df: pd.DataFrame, csv_path: Path):
+    """
+    Registra a razão de expansão observada ao carregar um CSV (média móvel).
+    
+    Args:
+        stats_path: Arquivo JSON com as razões registradas
+        table_name: Nome da tabela
+        df: DataFrame carregado a partir de csv_path
+        csv_path: Arquivo CSV de origem
+    """
+    csv_bytes = csv_path.stat().st_size
+    if csv_bytes == 0:
+        return
+    
+    observed = df.memory_usage(deep=True).sum() / csv_bytes
+    
+    with _memory_stats_lock:
+        try:
+            with open(stats_path, "r", encoding="utf-8") as f:
+                stats = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            stats = {}
+        
+        previous = stats.get(table_name, {}).get("expansion_ratio")
+        if previous is None:
+            ratio = observed
+        else:
+            ratio = MEMORY_RATIO_SMOOTHING * observed + (1 - MEMORY_RATIO_SMOOTHING) * previous
+        
+        stats[table_name] = {
+            "expansion_ratio": round(float(ratio), 3),
+            "updated_at": datetime.datetime.now().isoformat()
+        }
+        
+        try:
+            stats_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(stats_path, "w", encoding="utf-8") as f:
+                json.dump(stats, f, indent=2)
+        except OSError as e:
+            logger.warning(f"Erro ao gravar estatísticas de memória em {stats_path}: {e}")
+            return
+    
+    logger.debug("Razão de expansão de %s: observada %.2f, registrada %.2f", table_name, observed, ratio)
+
+
+def plan_table_admission(estimate_mb: float, budget: MemoryBudget) -> Tuple[str, int]:
+    """
+    Decide como processar uma tabela dado o orçamento de memória.
+    
+    Modos:
+        memory: a estimativa cabe no orçamento; a tabela é carregada inteira
+            (aguardando na fila se outras tabelas estiverem ocupando o orçamento)
+        chunked: a estimativa excede o orçamento; o diff é feito em partições
+            por hash da PK, cada uma cabendo no orçamento
+    
+    Args:
+        estimate_mb: Pico de memória estimado para processar a tabela inteira
+        budget: Orçamento de memória compartilhado
+        
+    Returns:
+        Tupla (modo, número de partições)
+    """
+    if budget.limit_mb is None or estimate_mb <= budget.limit_mb:
+        return "memory", 1
+    
+    # Margem de 20% para desbalanceamento entre partições
+    n_partitions = math.ceil(estimate_mb / (budget.limit_mb * 0.8))
+    return "chunked", n_partitions
+
+
+# ==================== FUNÇÕES DE FULL-LOAD ====================
+
+def prepare_full_load(
+    config: Dict,
+    table: Dict,
+    dirs: Dict[str, Path],
+    budget: Optional[MemoryBudget] = None
+) -> Optional[Tuple[Path, str]]:
+    """
+    Converte o CSV de uma tabela para o Parquet de full-load (sem fazer upload).
+    
+    Args:
+        config: Configuração do dataset
+        table: Configuração da tabela
+        dirs: Diretórios do dataset (ver get_data_dirs)
+        budget: Orçamento de memória compartilhado (opcional)
+        
+    Returns:
+        Tupla (Parquet temporário, chave S3 de destino), ou None em caso de falha
+    """
+    table_name = table["name"]
+    separator = table["sep"]
+    prefix = config["aws"]["prefix"]
+    dir_actual = dirs["actual"]
+    stats_path = dirs["memory_stats"]
+    
+    if budget is None:
+        budget = MemoryBudget()
+    workers = config.get("workers", {})
+    default_ratio = workers.get("memory_expansion_factor", DEFAULT_MEMORY_EXPANSION_FACTOR)
+    
+    # Caminho do CSV original
+    csv_path = dir_actual / f"{table_name}.csv"
+    
+    # Controle de admissão: tabelas que não cabem no orçamento são convertidas em blocos
+    estimate_mb = estimate_memory_mb(
+        [csv_path], get_memory_ratio(stats_path, table_name, default_ratio)
+    )
+    mode, n_partitions = plan_table_admission(estimate_mb, budget)
+    reserved_mb = budget.acquire(estimate_mb / n_partitions, table_name)
+    
+    try:
+        if not csv_path.exists():
+            logger.warning(f"Arquivo não encontrado: {csv_path}")
+            return None
+        
+        logger.info(f"Processando full-load: {table_name} (modo: {mode})")
+        
+        # Caminho temporário para Parquet
+        parquet_path = dir_actual / f"{table_name}.parquet"
+        
+        if mode == "chunked":
+            n_rows = write_parquet_chunked(
+                csv_path, separator, parquet_path, workers.get("chunksize", 100000)
+            )
+            logger.debug("Parquet criado em blocos: %s (%d linhas)", parquet_path, n_rows)
+        else:
+            # Lê CSV
+            df = pd.read_csv(csv_path, sep=separator)
+            logger.debug("CSV lido: %d linhas, %d colunas", df.shape[0], df.shape[1])
+            record_memory_ratio(stats_path, table_name, df, csv_path)
+            
+            # Adiciona coluna DtAtualizacao se não existir (para compatibilidade com PySpark)
+            if 'DtAtualizacao' not in df.columns:
+                df['DtAtualizacao'] = datetime.datetime.now()
+                logger.debug("Coluna DtAtualizacao adicionada em full-load de %s", table_name)
+            
+            # Salva como Parquet
+            df.to_parquet(parquet_path, index=False, engine='pyarrow')
+            logger.debug("Parquet criado: %s", parquet_path)
+        
+        # Chave S3 para full-load
+        s3_key = f"{prefix}/full-load/{table_name}/{table_name}.parquet"
+        
+        return parquet_path, s3_key
+        
+    except Exception as e:
+        logger.error(f"Erro ao processar full-load de {table_name}: {e}", exc_info=True)
+        return None
+    finally:
+        budget.release(reserved_mb)
+
+
+# Tipo final de cada classe de coluna inferida em blocos (ver infer_csv_dtypes)
+CSV_DTYPE_BY_KIND = {"int": "Int64", "float": "float64", "bool": "bool", "str": str, None: "float64"}
+
+
+def infer_csv_dtypes(csv_path: Path, separator: str, chunksize: int = 100000) -> Dict:
+    """
+    Infere em blocos o tipo de cada coluna de um CSV, alargando-o quando os blocos discordam.
+    
+    Inteiros viram Int64 anulável (um bloco posterior pode ter nulos),
+    inteiros que aparecem com decimais em outro bloco viram float64 e
+    qualquer outra mistura (texto, booleanos com números) vira texto.
+    Blocos em que a coluna é toda nula não alteram o tipo.
+    
+    Args:
+        csv_path: CSV de origem
+        separator: Separador do CSV
+        chunksize: Linhas lidas por bloco
+        
+    Returns:
+        Dicionário {coluna: dtype} para o parâmetro 'dtype' do read_csv
+    """
+    kinds = {}
+    
+    for chunk in pd.read_csv(csv_path, sep=separator, chunksize=chunksize):
+        for col in chunk.columns:
+            values = chunk[col]
+            if values.isna().all():
+                kinds.setdefault(col, None)
+                continue
+            
+            if pd.api.types.is_bool_dtype(values):
+                kind = "bool"
+            elif pd.api.types.is_integer_dtype(values):
+                kind = "int"
+            elif pd.api.types.is_float_dtype(values):
+                kind = "float"
+            else:
+                kind = "str"
+            
+            current = kinds.get(col)
+            if current is None or current == kind:
+                kinds[col] = kind
+            elif {current, kind} == {"int", "float"}:
+                kinds[col] = "float"
+            else:
+                kinds[col] = "str"
+    
+    return {col: CSV_DTYPE_BY_KIND[kind] for col, kind in kinds.items()}
+
+
+def write_parquet_chunked(
+    csv_path: Path,
+    separator: str,
+    parquet_path: Path,
+    chunksize: int = 100000
+) -> int:
+    """
+    Converte um CSV para Parquet em blocos, sem carregar a tabela inteira.
+    
+    O CSV é percorrido duas vezes: a primeira infere os tipos alargando-os
+    entre blocos (ver infer_csv_dtypes) e a segunda grava todos os blocos
+    com esses tipos, de modo que tenham o mesmo schema Parquet mesmo quando
+    decimais ou texto só aparecem no fim do arquivo. Como no full-load em
+    memória, DtAtualizacao é adicionada se não existir.
+    
+    Args:
+        csv_path: CSV de origem
+        separator: Separador do CSV
+        parquet_path: Parquet de destino
+        chunksize: Linhas lidas por bloco
+        
+    Returns:
+        Número de linhas gravadas
+    """
+    dtypes = infer_csv_dtypes(csv_path, separator, chunksize)
+    
+    dt_atualizacao = datetime.datetime.now()
+    writer = None
+    n_rows = 0
+    
+    try:
+        for chunk in pd.read_csv(csv_path, sep=separator, chunksize=chunksize, dtype=dtypes):
+            if 'DtAtualizacao' not in chunk.columns:
+                chunk['DtAtualizacao'] = dt_atualizacao
+            
+            if writer is None:
+                batch = pa.Table.from_pandas(chunk, preserve_index=False)
+                schema = batch.schema
+                # Coluna de texto toda nula no primeiro bloco não tem tipo no Arrow
+                for i, field in enumerate(schema):
+                    if pa.types.is_null(field.type):
+                        schema = schema.set(i, field.with_type(pa.string()))
+                batch = batch.cast(schema)
+                writer = pq.ParquetWriter(parquet_path, schema)
+            else:
+                batch = pa.Table.from_pandas(chunk, schema=writer.schema, preserve_index=False)
+            
+            writer.write_table(batch)
+            n_rows += len(chunk)
+        
+        # CSV só com cabeçalho: grava um Parquet vazio com as colunas
+        if writer is None:
+            empty = pd.read_csv(csv_path, sep=separator, nrows=0)
+            if 'DtAtualizacao' not in empty.columns:
+                empty['DtAtualizacao'] = pd.Series(dtype="datetime64[ns]")
+            empty.to_parquet(parquet_path, index=False, engine='pyarrow')
+    finally:
+        if writer is not None:
+            writer.close()
+    
+    return n_rows
+
+
+def process_full_load(config: Dict, s3_client=None, budget: Optional[MemoryBudget] = None) -> bool:
+    """
+    Processa o full-load de todas as tabelas:
+    1. Lê CSV do diretório actual
+    2. Converte para Parquet
+    3. Faz upload para S3 em full-load/
+    
+    Args:
+        config: Dicionário de configuração
+        s3_client: Cliente S3 (opcional)
+        budget: Orçamento de memória compartilhado (opcional)
+        
+    Returns:
+        True se todos os uploads foram bem-sucedidos, False caso contrário
+    """
+    logger.info("=" * 60)
+    logger.info("INICIANDO PROCESSO DE FULL-LOAD")
+    logger.info("=" * 60)
+    
+    if s3_client is None:
+        s3_client = get_s3_client()
+    
+    bucket = config["aws"]["bucket"]
+    tables = config["tables"]
+    dirs = get_data_dirs(config)
+    
+    success = True
+    
+    for table in tables:
+        result = prepare_full_load(config, table, dirs, budget)
+        
+        if result is None:
+            success = False
+            continue
+        
+        parquet_path, s3_key = result
+        
+        # Upload para S3
+        if not upload_to_s3(str(parquet_path), bucket, s3_key, s3_client):
+            success = False
+        
+        # Remove arquivo Parquet temporário
+        parquet_path.unlink()
+        logger.debug("Arquivo temporário removido: %s", parquet_path)
+    
+    if success:
+        logger.info("Full-load concluído com sucesso para todas as tabelas")
+    else:
+        logger.warning("Full-load concluído com alguns erros")
+    
+    return success
+
+
+# ==================== QUALIDADE DE DADOS ====================
+
+# Limites padrão das verificações de qualidade (métrica > limite dispara o nível)
+DEFAULT_QUALITY_THRESHOLDS = {
+    "warn": {
+        "duplicate_pk_ratio": 0.0,
+        "null_pk_ratio": 0.0,
+        "coercion_failure_ratio": 0.0,
+        "row_delta_ratio": 0.2
+    },
+    "fail": {}
+}
+
+
+def new_quality_stats() -> Dict:
+    """
+    Cria o acumulador de estatísticas de qualidade preenchido durante o diff.
+    """
+    return {
+        "rows": 0,
+        "rows_last": 0,
+        "duplicate_pks": 0,
+        "null_pks": 0,
+        "coercion_failures": 0,
+        "null_counts": {}
+    }
+
+
+def update_quality_stats(
+    quality: Dict,
+    df_actual: pd.DataFrame,
+    df_last: Optional[pd.DataFrame],
+    pk,
+    date_field: Optional[str] = None
+):
+    """
+    Acumula as estatísticas de qualidade dos DataFrames já carregados para o diff.
+    
+    Opera sobre as colunas em memória (nenhuma releitura do CSV); no CDC
+    particionado é chamada uma vez por partição e os totais se somam, já
+    que uma PK sempre cai na mesma partição. As falhas de conversão do campo
+    de data são contadas em todas as linhas de df_actual (inserções e carga
+    inicial inclusive), o mesmo denominador de coercion_failure_ratio.
+    
+    Args:
+        quality: Acumulador criado por new_quality_stats
+        df_actual: DataFrame do snapshot atual (com a coluna de chave)
+        df_last: DataFrame do snapshot anterior (None na carga inicial)
+        pk: Coluna(s) de chave primária
+        date_field: Campo de data da tabela (opcional)
+    """
+    key = get_key_column(pk)
+    pk_columns = get_pk_columns(pk)
+    
+    quality["rows"] += len(df_actual)
+    quality["rows_last"] += len(df_last) if df_last is not None else 0
+    quality["duplicate_pks"] += int(df_actual[key].duplicated().sum())
+    quality["null_pks"] += int(df_actual[pk_columns].isna().any(axis=1).sum())
+    
+    null_counts = quality["null_counts"]
+    for col, n_nulls in df_actual.isna().sum().items():
+        if col != PK_KEY_COLUMN and n_nulls:
+            null_counts[col] = null_counts.get(col, 0) + int(n_nulls)
+    
+    if date_field and date_field in df_actual.columns:
+        values = df_actual[date_field]
+        try:
+            parsed = pd.to_datetime(values, errors='coerce')
+        except Exception:
+            # Mesmo critério do diff: o campo é comparado como texto
+            return
+        quality["coercion_failures"] += int((parsed.isna() & values.notna()).sum())
+
+
+def get_quality_thresholds(config: Dict, table: Dict) -> Dict[str, Dict[str, float]]:
+    """
+    Combina os limites padrão, os de 'quality' no config e os de 'tables[].quality'.
+    """
+    thresholds = {level: dict(limits) for level, limits in DEFAULT_QUALITY_THRESHOLDS.items()}
+    for source in (config.get("quality", {}), table.get("quality", {})):
+        for level in thresholds:
+            thresholds[level].update(source.get(level, {}))
+    return thresholds
+
+
+def evaluate_quality(quality: Dict, thresholds: Dict[str, Dict[str, float]]) -> Dict:
+    """
+    Monta o relatório compacto de qualidade de uma tabela e seu status.
+    
+    Métricas comparadas com os limites (frações de 0.0 a 1.0):
+        duplicate_pk_ratio: PKs repetidas no snapshot atual
+        null_pk_ratio: linhas com PK nula
+        coercion_failure_ratio: valores do campo de data que viraram NaT
+        row_delta_ratio: variação do número de linhas em relação ao anterior
+        null_ratio: maior fração de nulos entre as colunas
+    
+    Args:
+        quality: Estatísticas acumuladas (ver update_quality_stats)
+        thresholds: Limites {'warn': {...}, 'fail': {...}}
+        
+    Returns:
+        Relatório com contagens, métricas, violações e status ('ok', 'warn' ou 'fail')
+    """
+    rows = quality["rows"]
+    rows_last = quality["rows_last"]
+    
+    metrics = {
+        "duplicate_pk_ratio": quality["duplicate_pks"] / rows if rows else 0.0,
+        "null_pk_ratio": quality["null_pks"] / rows if rows else 0.0,
+        "coercion_failure_ratio": quality["coercion_failures"] / rows if rows else 0.0,
+        "null_ratio": max(quality["null_counts"].values(), default=0) / rows if rows else 0.0
+    }
+    if rows_last:
+        metrics["row_delta_ratio"] = abs(rows - rows_last) / rows_last
+    
+    violations = []
+    status = "ok"
+    for level in ("warn", "fail"):
+        for metric, limit in thresholds.get(level, {}).items():
+            value = metrics.get(metric)
+            if value is not None and limit is not None and value > limit:
+                violations.append(f"{metric}={value:.4f} > {limit} ({level})")
+                status = level
+    
+    report = {
+        "status": status,
+        "rows": rows,
+        "row_delta": rows - rows_last if rows_last else None,
+        "duplicate_pks": quality["duplicate_pks"],
+        "null_pks": quality["null_pks"],
+        "coercion_failures": quality["coercion_failures"],
+        "null_counts": quality["null_counts"],
+        "violations": violations
+    }
+    if "partitions_checked" in quality:
+        # Guardrail do CDC particionado: estatísticas só das partições amostradas
+        report["partitions_checked"] = quality["partitions_checked"]
+    return report
+
+
+# ==================== FUNÇÕES DE CDC ====================
+
+# Coluna com a chave codificada de PKs compostas (hash de 64 bits das colunas da PK)
+PK_KEY_COLUMN = "_pk_key"
+
+
+def get_pk_columns(pk) -> List[str]:
+    """
+    Normaliza a PK da configuração ('pk' como texto ou lista de colunas) para uma lista.
+    """
+    return [pk] if isinstance(pk, str) else list(pk)
+
+
+def get_key_column(pk) -> str:
+    """
+    Retorna a coluna usada nos joins do CDC: a própria PK simples ou PK_KEY_COLUMN.
+    """
+    pk_columns = get_pk_columns(pk)
+    return pk_columns[0] if len(pk_columns) == 1 else PK_KEY_COLUMN
+
+
+def normalize_key_values(values: pd.Series) -> pd.Series:
+    """
+    Dá ao mesmo valor de PK a mesma representação independentemente do dtype
+    inferido pelo read_csv: inteiros e floats inteiros (coluna int que ganhou
+    nulos) viram Int64, então 1 e 1.0 se tornam o mesmo valor.
+    """
+    if pd.api.types.is_integer_dtype(values):
+        return values.astype("Int64")
+    if pd.api.types.is_float_dtype(values):
+        non_null = values.dropna()
+        if (non_null % 1 == 0).all():
+            return values.astype("Int64")
+    return values
+
+
+def encode_pk(df: pd.DataFrame, pk_columns: List[str]) -> pd.Series:
+    """
+    Codifica uma PK composta em um único inteiro de 64 bits por linha.
+    
+    O hash é vetorizado e depende só dos valores (não do índice), então a
+    mesma tupla gera a mesma chave nos dois snapshots. Os componentes passam
+    por normalize_key_values antes do hash, então uma coluna int que ganhou
+    nulos (float64) em um dos snapshots continua gerando as mesmas chaves.
+    O resultado é int64 para caber no SQLite.
+    
+    Args:
+        df: DataFrame com as colunas da PK
+        pk_columns: Colunas que compõem a PK
+        
+    Returns:
+        Series int64 com o mesmo índice de df
+    """
+    components = pd.DataFrame({col: normalize_key_values(df[col]) for col in pk_columns})
+    hashes = pd.util.hash_pandas_object(components, index=False)
+    return pd.Series(hashes.values.view("int64"), index=df.index, name=PK_KEY_COLUMN)
+
+
+def add_pk_key(df: pd.DataFrame, pk) -> str:
+    """
+    Garante a coluna de chave em df (in place) e retorna o nome dela.
+    
+    Para PK simples nada é alterado; para PK composta a coluna PK_KEY_COLUMN
+    é calculada uma única vez e reaproveitada pelas etapas seguintes.
+    """
+    key = get_key_column(pk)
+    if key == PK_KEY_COLUMN and key not in df.columns:
+        df[key] = encode_pk(df, get_pk_columns(pk))
+    return key
+
+
+def get_insert_lines(df_last: pd.DataFrame, df_actual: pd.DataFrame, pk: str) -> pd.DataFrame:
+    """
+    Identifica linhas inseridas (presentes no atual mas não no anterior).
+    
+    Args:
+        df_last: DataFrame do snapshot anterior
+        df_actual: DataFrame do snapshot atual
+        pk: Nome da coluna de chave primária
+        
+    Returns:
+        DataFrame com as linhas inseridas e coluna 'op' = 'I'
+    """
+    df_insert = df_actual[~df_actual[pk].isin(df_last[pk])].copy()
+    df_insert["op"] = "I"
+    logger.debug("Inserções detectadas: %d", len(df_insert))
+    return df_insert
+
+
+def get_update_lines(
+    df_last: pd.DataFrame,
+    df_actual: pd.DataFrame,
+    pk: str,
+    date_field: str
+) -> pd.DataFrame:
+    """
+    Identifica linhas atualizadas (PK existe em ambos e campo de data é maior no atual).
+    Se date_field for None ou vazio, compara todas as colunas por hash.
+    
+    Args:
+        df_last: DataFrame do snapshot anterior
+        df_actual: DataFrame do snapshot atual
+        pk: Nome da coluna de chave primária
+        date_field: Nome do campo de data para comparação (pode ser None)
+        
+    Returns:
+        DataFrame com as linhas atualizadas e coluna 'op' = 'U'
+    """
+    # Se não houver campo de data, compara todas as colunas por hash
+    if not date_field or date_field == "":
+        # Cria hash de todas as colunas (exceto PK)
+        cols_to_hash = [c for c in df_last.columns if c != pk]
         df_last_hash = df_last.copy()
         df_actual_hash = df_actual.copy()
         df_last_hash['_hash'] = df_last_hash[cols_to_hash].apply(lambda x: hash(tuple(x)), axis=1)
@@ -397,7 +1394,7 @@ def get_update_lines(
         
         df_update = df_actual[df_actual[pk].isin(updated_pks)].copy()
         df_update["op"] = "U"
-        logger.debug(f"Atualizações detectadas (por hash): {len(df_update)}")
+        logger.debug("Atualizações detectadas (por hash): %d", len(df_update))
         return df_update
     
     # Merge para comparar
@@ -432,7 +1429,7 @@ def get_update_lines(
     # Retorna as linhas atualizadas do snapshot atual
     df_update = df_actual[df_actual[pk].isin(updated_pks)].copy()
     df_update["op"] = "U"
-    logger.debug(f"Atualizações detectadas: {len(df_update)}")
+    logger.debug("Atualizações detectadas: %d", len(df_update))
     return df_update
 
 
@@ -450,53 +1447,706 @@ def get_delete_lines(df_last: pd.DataFrame, df_actual: pd.DataFrame, pk: str) ->
     """
     df_delete = df_last[~df_last[pk].isin(df_actual[pk])].copy()
     df_delete["op"] = "D"
-    logger.debug(f"Deleções detectadas: {len(df_delete)}")
+    logger.debug("Deleções detectadas: %d", len(df_delete))
     return df_delete
 
 
-def create_cdc(
-    df_actual: pd.DataFrame,
+# Modos de payload para linhas de atualização ('update_payload' em cada tabela)
+UPDATE_PAYLOAD_MODES = ("full", "changed_columns", "sparse")
+
+
+def get_changed_columns(
     df_last: pd.DataFrame,
-    pk: str,
-    date_field: str
+    df_update: pd.DataFrame,
+    pk
 ) -> pd.DataFrame:
     """
-    Cria o DataFrame de CDC combinando inserções, atualizações e deleções.
-    
+    Calcula, coluna a coluna, quais campos mudaram em cada linha atualizada.
+
+    Colunas novas no snapshot atual (ausentes em df_last) são sempre
+    consideradas alteradas. Dois valores nulos são considerados iguais.
+
+    Args:
+        df_last: DataFrame do snapshot anterior
+        df_update: Linhas atualizadas (snapshot atual, com coluna 'op')
+        pk: Coluna(s) de chave primária
+
+    Returns:
+        DataFrame booleano com o mesmo índice de df_update e uma coluna
+        por campo de dados (exceto PK e 'op')
+    """
+    key = get_key_column(pk)
+    excluded = {key, "op", *get_pk_columns(pk)}
+    data_cols = [c for c in df_update.columns if c not in excluded]
+    common_cols = [c for c in data_cols if c in df_last.columns]
+
+    # Alinha os valores anteriores às linhas atualizadas pela PK. Com PK
+    # duplicada no anterior vale a primeira ocorrência (o merge não pode
+    # multiplicar as linhas de df_update)
+    df_old = (
+        df_update[[key]]
+        .merge(
+            df_last[[key] + common_cols].drop_duplicates(subset=key),
+            how='left',
+            on=key
+        )
+        .set_index(df_update.index)
+    )
+
+    changed = pd.DataFrame(True, index=df_update.index, columns=data_cols)
+    for col in common_cols:
+        new_values = df_update[col]
+        old_values = df_old[col]
+        both_null = new_values.isna() & old_values.isna()
+        changed[col] = (new_values != old_values) & ~both_null
+
+    return changed
+
+
+def build_update_payload(
+    df_update: pd.DataFrame,
+    df_last: pd.DataFrame,
+    pk,
+    update_payload: str = "full"
+) -> pd.DataFrame:
+    """
+    Monta o payload das linhas de atualização conforme o modo configurado.
+
+    Modos:
+        full: linha completa do snapshot atual (comportamento original)
+        changed_columns: linha completa + coluna 'changed_cols' com a lista
+            de campos alterados
+        sparse: apenas PK, 'op' e campos alterados são preenchidos; os
+            demais ficam nulos. Inclui 'changed_cols' para distinguir
+            "não alterado" de "alterado para nulo"
+
+    Args:
+        df_update: Linhas atualizadas retornadas por get_update_lines
+        df_last: DataFrame do snapshot anterior
+        pk: Coluna(s) de chave primária
+        update_payload: Modo de payload ('full', 'changed_columns' ou 'sparse')
+
+    Returns:
+        DataFrame de atualizações no layout solicitado
+    """
+    if update_payload not in UPDATE_PAYLOAD_MODES:
+        logger.warning(f"Modo de payload desconhecido: {update_payload}. Usando 'full'.")
+        update_payload = "full"
+
+    if update_payload == "full" or df_update.empty:
+        return df_update
+
+    changed = get_changed_columns(df_last, df_update, pk)
+
+    # Lista de colunas alteradas por linha, calculada de forma vetorizada
+    labels = pd.Index(changed.columns) + ","
+    changed_cols = changed.dot(labels).str.rstrip(",").str.split(",")
+    df_payload = df_update.copy()
+    df_payload["changed_cols"] = changed_cols.where(changed.any(axis=1), None)
+
+    if update_payload == "sparse":
+        for col in changed.columns:
+            values = df_payload[col]
+            # Tipos inteiros/booleanos viram nullable para não perder precisão
+            if pd.api.types.is_integer_dtype(values):
+                values = values.astype("Int64")
+            elif pd.api.types.is_bool_dtype(values):
+                values = values.astype("boolean")
+            df_payload[col] = values.where(changed[col])
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "Payload de atualização '%s': %d campo(s) alterado(s) em %d linha(s)",
+            update_payload, int(changed.values.sum()), len(df_payload)
+        )
+    return df_payload
+
+
+def estimate_change_shares(
+    df_actual: pd.DataFrame,
+    df_last: pd.DataFrame,
+    pk,
+    sample_size: int = 10000,
+    seed: int = 42
+) -> Optional[Dict[str, float]]:
+    """
+    Estima a fração de inserções, atualizações e deleções sem calcular o CDC completo.
+
+    Usa uma amostra de PKs de cada snapshot: a proporção de PKs ausentes no
+    outro lado estima inserções/deleções, e a comparação de fingerprints
+    (hash das colunas em comum) das PKs presentes em ambos estima atualizações.
+
+    Args:
+        df_actual: DataFrame do snapshot atual
+        df_last: DataFrame do snapshot anterior
+        pk: Coluna(s) de chave primária
+        sample_size: Quantidade máxima de linhas amostradas de cada snapshot
+        seed: Semente da amostragem (torna a estimativa reprodutível)
+
+    Returns:
+        Dicionário {'insert', 'update', 'delete'}: inserções e atualizações são
+        frações de df_actual, deleções são fração de df_last. None se a PK não
+        existir em algum dos snapshots ou se algum deles estiver vazio.
+    """
+    pk_columns = get_pk_columns(pk)
+    if any(c not in df_actual.columns or c not in df_last.columns for c in pk_columns):
+        logger.warning(f"PK {pk_columns} ausente em um dos snapshots; diff não é confiável")
+        return None
+
+    n_actual, n_last = len(df_actual), len(df_last)
+    if n_actual == 0 or n_last == 0:
+        return None
+
+    pk = add_pk_key(df_actual, pk)
+    add_pk_key(df_last, pk_columns)
+
+    common_cols = [c for c in df_actual.columns if c in df_last.columns and c != pk]
+
+    # Inserções + atualizações: amostra do snapshot atual
+    sample_actual = (
+        df_actual[[pk] + common_cols]
+        .sample(n=min(sample_size, n_actual), random_state=seed)
+        .drop_duplicates(subset=pk)
+    )
+    # Inner join preserva os dtypes originais (sem NaN introduzido pelo merge)
+    matched_last = df_last[[pk] + common_cols].drop_duplicates(subset=pk).merge(
+        sample_actual[[pk]], how='inner', on=pk
+    )
+    insert_share = 1 - len(matched_last) / len(sample_actual)
+
+    # Colunas numéricas cujo dtype variou (ex.: int que ganhou nulos e virou float)
+    # são comparadas como float para não marcar todas as linhas como alteradas
+    for col in common_cols:
+        if (
+            sample_actual[col].dtype != matched_last[col].dtype
+            and pd.api.types.is_numeric_dtype(sample_actual[col])
+            and pd.api.types.is_numeric_dtype(matched_last[col])
+        ):
+            sample_actual[col] = sample_actual[col].astype("float64")
+            matched_last[col] = matched_last[col].astype("float64")
+
+    update_share = 0.0
+    if common_cols and len(matched_last) > 0:
+        hash_actual = pd.Series(
+            pd.util.hash_pandas_object(sample_actual[common_cols], index=False).values,
+            index=sample_actual[pk]
+        )
+        hash_last = pd.Series(
+            pd.util.hash_pandas_object(matched_last[common_cols], index=False).values,
+            index=matched_last[pk]
+        )
+        changed_share = (hash_actual.reindex(hash_last.index) != hash_last).mean()
+        update_share = changed_share * (1 - insert_share)
+
+    # Deleções: amostra do snapshot anterior
+    sample_last = df_last[pk].sample(n=min(sample_size, n_last), random_state=seed)
+    delete_share = (~sample_last.isin(df_actual[pk])).mean()
+
+    return {
+        "insert": float(insert_share),
+        "update": float(update_share),
+        "delete": float(delete_share)
+    }
+
+
+def estimate_change_ratio(
+    df_actual: pd.DataFrame,
+    df_last: pd.DataFrame,
+    pk,
+    sample_size: int = 10000,
+    seed: int = 42
+) -> float:
+    """
+    Estima a fração de linhas alteradas entre os snapshots (ver estimate_change_shares).
+
+    Args:
+        df_actual: DataFrame do snapshot atual
+        df_last: DataFrame do snapshot anterior
+        pk: Coluna(s) de chave primária
+        sample_size: Quantidade máxima de linhas amostradas de cada snapshot
+        seed: Semente da amostragem (torna a estimativa reprodutível)
+
+    Returns:
+        Fração estimada de linhas alteradas (0.0 a 1.0). Retorna 1.0 se a PK
+        não existir em algum dos snapshots ou se algum deles estiver vazio.
+    """
+    shares = estimate_change_shares(df_actual, df_last, pk, sample_size, seed)
+    if shares is None:
+        return 1.0
+
+    n_actual, n_last = len(df_actual), len(df_last)
+    est_changes = (shares["insert"] + shares["update"]) * n_actual + shares["delete"] * n_last
+    ratio = min(est_changes / max(n_actual, n_last), 1.0)
+
+    logger.debug(
+        "Estimativa de mudança - Inserções: %.2f%%, Atualizações: %.2f%%, "
+        "Deleções: %.2f%%, Total: %.2f%%",
+        shares["insert"] * 100, shares["update"] * 100, shares["delete"] * 100, ratio * 100
+    )
+    return float(ratio)
+
+
+def read_snapshot(csv_path: Path, separator: str, nrows: Optional[int] = None) -> pd.DataFrame:
+    """
+    Lê um snapshot CSV, removendo a coluna 'op' de execuções anteriores.
+    
+    Args:
+        csv_path: Caminho do CSV
+        separator: Separador do CSV
+        nrows: Lê apenas as primeiras linhas (opcional)
+        
+    Returns:
+        DataFrame do snapshot
+    """
+    df = pd.read_csv(csv_path, sep=separator, nrows=nrows)
+    
+    if 'op' in df.columns:
+        df = df.drop(columns=['op'])
+    
+    return df
+
+
+def get_csv_columns(csv_path: Path, separator: str) -> List[str]:
+    """
+    Retorna as colunas do cabeçalho de um CSV sem ler as linhas.
+    """
+    return list(pd.read_csv(csv_path, sep=separator, nrows=0).columns)
+
+
+def get_partition_buckets(df: pd.DataFrame, pk, n_partitions: int) -> pd.Series:
+    """
+    Retorna a partição (0 a n_partitions - 1) de cada linha pelo hash da PK.
+    
+    O hash é da PK normalizada e convertida para texto: estável mesmo se o
+    dtype inferido variar entre blocos ou snapshots (1 e 1.0 caem na mesma
+    partição).
+    """
+    pk_values = pd.DataFrame({col: normalize_key_values(df[col]) for col in get_pk_columns(pk)})
+    return pd.util.hash_pandas_object(pk_values.astype(str), index=False) % n_partitions
+
+
+def write_snapshot_partitions(
+    csv_path: Path,
+    separator: str,
+    pk,
+    n_partitions: int,
+    out_dir: Path,
+    chunksize: int = 100000
+) -> List[Path]:
+    """
+    Divide um snapshot em um CSV por partição de PK, numa única leitura.
+    
+    O CSV é percorrido em blocos de 'chunksize' linhas e cada bloco é
+    acrescentado aos arquivos das partições em que suas linhas caem, então
+    o pico de memória fica limitado a um bloco.
+    
+    Args:
+        csv_path: Caminho do CSV
+        separator: Separador do CSV
+        pk: Coluna(s) de chave primária
+        n_partitions: Número total de partições
+        out_dir: Diretório onde os arquivos das partições são gravados
+        chunksize: Linhas lidas por bloco
+        
+    Returns:
+        Caminho de cada partição (arquivos sem linhas não são criados)
+    """
+    paths = [out_dir / f"{csv_path.stem}_{partition}.csv" for partition in range(n_partitions)]
+    
+    for chunk in pd.read_csv(csv_path, sep=separator, chunksize=chunksize):
+        if 'op' in chunk.columns:
+            chunk = chunk.drop(columns=['op'])
+        
+        buckets = get_partition_buckets(chunk, pk, n_partitions)
+        for partition, rows in chunk.groupby(buckets.values, sort=False):
+            path = paths[partition]
+            rows.to_csv(path, sep=separator, index=False, mode="a", header=not path.exists())
+    
+    return paths
+
+
+def read_snapshot_partition(path: Path, separator: str, columns: List[str]) -> pd.DataFrame:
+    """
+    Lê uma partição gravada por write_snapshot_partitions (vazia se não tiver linhas).
+    """
+    if not path.exists():
+        return pd.DataFrame(columns=[c for c in columns if c != 'op'])
+    return read_snapshot(path, separator)
+
+
+def create_cdc_chunked(
+    actual_csv: Path,
+    last_csv: Path,
+    separator: str,
+    pk,
+    date_field: str,
+    update_payload: str = "full",
+    n_partitions: int = 2,
+    chunksize: int = 100000,
+    max_change_ratio: Optional[float] = None,
+    sample_size: int = 10000,
+    quality: Optional[Dict] = None,
+    work_dir: Optional[Path] = None
+) -> Tuple[Optional[pd.DataFrame], Optional[float]]:
+    """
+    Gera o CDC particionando os snapshots por hash da PK, uma partição por vez.
+    
+    Cada snapshot é lido uma única vez e dividido em arquivos temporários
+    por partição. Como uma PK sempre cai na mesma partição nos dois
+    snapshots, o CDC de cada partição é independente e o resultado é a
+    concatenação de todas. Cada partição é uma amostra aleatória da tabela:
+    o guardrail de taxa de mudança usa as primeiras partições até reunir
+    'sample_size' linhas (partições vazias não contam) antes de processar
+    as demais.
+    
+    Args:
+        actual_csv: CSV do snapshot atual
+        last_csv: CSV do snapshot anterior
+        separator: Separador dos CSVs
+        pk: Coluna(s) de chave primária
+        date_field: Nome do campo de data para comparação
+        update_payload: Layout das linhas 'U' (ver build_update_payload)
+        n_partitions: Número de partições
+        chunksize: Linhas lidas por bloco
+        max_change_ratio: Limite do guardrail (None = desabilitado)
+        sample_size: Tamanho da amostra do guardrail
+        quality: Acumulador de qualidade (ver update_quality_stats; opcional).
+            Se o guardrail disparar, contém só as partições amostradas
+            (registradas em 'partitions_checked')
+        work_dir: Diretório dos arquivos temporários de partição (padrão: o
+            diretório temporário do sistema)
+        
+    Returns:
+        Tupla (DataFrame de CDC ou None se o guardrail disparou, taxa de mudança estimada)
+    """
+    pk_columns = get_pk_columns(pk)
+    actual_columns = get_csv_columns(actual_csv, separator)
+    last_columns = get_csv_columns(last_csv, separator)
+    
+    # Sem a PK não há como particionar: mesmo tratamento do guardrail em memória
+    if any(c not in actual_columns or c not in last_columns for c in pk_columns):
+        if max_change_ratio is None:
+            raise KeyError(f"PK {pk_columns} ausente em um dos snapshots")
+        logger.warning(f"PK {pk_columns} ausente em um dos snapshots; diff não é confiável")
+        return None, 1.0
+    
+    logger.info(f"Gerando CDC em {n_partitions} partições")
+    
+    cdc_parts = []
+    change_ratio = None
+    guardrail_sample = [] if max_change_ratio is not None else None
+    
+    with tempfile.TemporaryDirectory(prefix="cdc_partitions_", dir=work_dir) as tmp:
+        actual_dir, last_dir = Path(tmp) / "actual", Path(tmp) / "last"
+        actual_dir.mkdir()
+        last_dir.mkdir()
+        actual_parts = write_snapshot_partitions(actual_csv, separator, pk, n_partitions, actual_dir, chunksize)
+        last_parts = write_snapshot_partitions(last_csv, separator, pk, n_partitions, last_dir, chunksize)
+        
+        for partition in range(n_partitions):
+            df_actual = read_snapshot_partition(actual_parts[partition], separator, actual_columns)
+            df_last = read_snapshot_partition(last_parts[partition], separator, last_columns)
+            pending = [(df_actual, df_last)]
+            
+            # Guardrail: acumula partições inteiras até a amostra ficar representativa
+            if guardrail_sample is not None:
+                guardrail_sample.append((df_actual, df_last))
+                sampled_actual = sum(len(a) for a, _ in guardrail_sample)
+                sampled_last = sum(len(l) for _, l in guardrail_sample)
+                if max(sampled_actual, sampled_last) < sample_size and partition < n_partitions - 1:
+                    continue
+                
+                sample_actual = pd.concat([a for a, _ in guardrail_sample], ignore_index=True)
+                sample_last = pd.concat([l for _, l in guardrail_sample], ignore_index=True)
+                change_ratio = estimate_change_ratio(sample_actual, sample_last, pk, sample_size)
+                if change_ratio > max_change_ratio:
+                    if quality is not None:
+                        add_pk_key(sample_actual, pk)
+                        update_quality_stats(quality, sample_actual, sample_last, pk, date_field)
+                        quality["partitions_checked"] = f"{partition + 1}/{n_partitions}"
+                    return None, change_ratio
+                
+                pending, guardrail_sample = guardrail_sample, None
+                del sample_actual, sample_last
+            
+            for df_actual, df_last in pending:
+                cdc_parts.append(create_cdc(df_actual, df_last, pk, date_field, update_payload, quality))
+            logger.debug("Partição %d/%d concluída", partition + 1, n_partitions)
+            
+            del df_actual, df_last, pending
+    
+    return pd.concat(cdc_parts, ignore_index=True), change_ratio
+
+
+def create_cdc(
+    df_actual: pd.DataFrame,
+    df_last: pd.DataFrame,
+    pk,
+    date_field: str,
+    update_payload: str = "full",
+    quality: Optional[Dict] = None
+) -> pd.DataFrame:
+    """
+    Cria o DataFrame de CDC combinando inserções, atualizações e deleções.
+
+    PKs compostas (lista de colunas) são codificadas em PK_KEY_COLUMN, que
+    fica no CDC gerado; assim inserções, deleções e o join de atualizações
+    continuam sendo uma única operação vetorizada sobre uma coluna.
+
     Args:
         df_actual: DataFrame do snapshot atual (ordem corrigida)
         df_last: DataFrame do snapshot anterior (ordem corrigida)
-        pk: Nome da coluna de chave primária
+        pk: Coluna(s) de chave primária
         date_field: Nome do campo de data para comparação
-        
+        update_payload: Layout das linhas 'U' (ver build_update_payload)
+        quality: Acumulador de qualidade preenchido com os mesmos DataFrames
+            do diff (ver update_quality_stats; opcional)
+
     Returns:
         DataFrame completo de CDC com coluna 'op'
     """
-    df_insert = get_insert_lines(df_last, df_actual, pk)
-    df_update = get_update_lines(df_last, df_actual, pk, date_field)
-    df_delete = get_delete_lines(df_last, df_actual, pk)
+    key = add_pk_key(df_actual, pk)
+    add_pk_key(df_last, pk)
+    
+    if quality is not None:
+        update_quality_stats(quality, df_actual, df_last, pk, date_field)
     
+    df_insert = get_insert_lines(df_last, df_actual, key)
+    df_update = get_update_lines(df_last, df_actual, key, date_field)
+    df_update = build_update_payload(df_update, df_last, pk, update_payload)
+    df_delete = get_delete_lines(df_last, df_actual, key)
+
     df_cdc = pd.concat([df_insert, df_update, df_delete], ignore_index=True)
     
     logger.info(
-        f"CDC criado - Inserções: {len(df_insert)}, "
-        f"Atualizações: {len(df_update)}, Deleções: {len(df_delete)}, "
-        f"Total: {len(df_cdc)}"
+        "CDC criado - Inserções: %d, Atualizações: %d, Deleções: %d, Total: %d",
+        len(df_insert), len(df_update), len(df_delete), len(df_cdc)
     )
     
     return df_cdc
 
 
-def process_cdc(config: Dict, s3_client=None) -> bool:
+def prepare_cdc(
+    config: Dict,
+    table: Dict,
+    dirs: Dict[str, Path],
+    run_id: str,
+    budget: Optional[MemoryBudget] = None,
+    pending_catalog: Optional[List] = None
+) -> Tuple[Dict, bool, Optional[Tuple[Path, str]]]:
+    """
+    Gera o CDC de uma tabela e o Parquet correspondente (sem fazer upload).
+    
+    Se a taxa de mudança estimada passar do limite configurado em
+    'guardrail', o CDC não é gerado e a tabela é marcada como 'full_replace'.
+    
+    Args:
+        config: Configuração do dataset
+        table: Configuração da tabela
+        dirs: Diretórios do dataset (ver get_data_dirs)
+        run_id: Identificador do ciclo (usado no catálogo)
+        budget: Orçamento de memória compartilhado (opcional)
+        pending_catalog: Se informada, os registros no catálogo são adiados:
+            cada um é acrescentado à lista como uma função sem argumentos,
+            a ser chamada quando o ciclo for confirmado
+        
+    Returns:
+        Tupla (entrada do manifesto, sucesso, (Parquet CDC, chave S3) ou None
+        quando não há arquivo para enviar)
+    """
+    prefix = config["aws"]["prefix"]
+    dir_actual, dir_cdc = dirs["actual"], dirs["cdc"]
+    
+    if budget is None:
+        budget = MemoryBudget()
+    workers = config.get("workers", {})
+    default_ratio = workers.get("memory_expansion_factor", DEFAULT_MEMORY_EXPANSION_FACTOR)
+    chunksize = workers.get("chunksize", 100000)
+    
+    guardrail = config.get("guardrail", {})
+    guardrail_enabled = guardrail.get("enabled", False)
+    sample_size = guardrail.get("sample_size", 10000)
+    
+    table_name = table["name"]
+    separator = table["sep"]
+    pk = table["pk"]
+    date_field = table["date_field"]
+    update_payload = table.get("update_payload", "full")
+    max_change_ratio = table.get("max_change_ratio", guardrail.get("max_change_ratio", 0.5))
+    manifest_entry = {"mode": "error"}
+    quality_enabled = config.get("quality", {}).get("enabled", True)
+    quality = new_quality_stats() if quality_enabled else None
+    
+    # Caminhos dos arquivos
+    actual_csv = dir_actual / f"{table_name}.csv"
+    last_csv = get_last_csv(dirs, table_name)
+    
+    # Controle de admissão: estima o pico de memória com a razão aprendida da tabela
+    expansion_ratio = get_memory_ratio(dirs["memory_stats"], table_name, default_ratio)
+    estimate_mb = estimate_memory_mb([actual_csv, last_csv], expansion_ratio) * CDC_PEAK_FACTOR
+    if last_csv.exists():
+        mode, n_partitions = plan_table_admission(estimate_mb, budget)
+    else:
+        mode, n_partitions = "memory", 1
+    reserved_mb = budget.acquire(estimate_mb / n_partitions, table_name)
+    
+    try:
+        logger.info(f"Processando CDC: {table_name} (modo: {mode}, estimativa: {estimate_mb:.0f} MB)")
+        
+        if not actual_csv.exists():
+            logger.warning(f"Snapshot atual não encontrado: {actual_csv}")
+            return manifest_entry, False, None
+        
+        change_ratio = None
+        
+        # Verifica se existe snapshot anterior
+        if not last_csv.exists():
+            df_actual = read_snapshot(actual_csv, separator)
+            record_memory_ratio(dirs["memory_stats"], table_name, df_actual, actual_csv)
+            logger.warning(
+                f"Snapshot anterior não encontrado para {table_name}. "
+                f"Todas as {len(df_actual)} linhas serão consideradas inserções."
+            )
+            add_pk_key(df_actual, pk)
+            if quality is not None:
+                update_quality_stats(quality, df_actual, None, pk, date_field)
+            df_cdc = df_actual.copy()
+            df_cdc["op"] = "I"
+        elif mode == "chunked":
+            df_cdc, change_ratio = create_cdc_chunked(
+                actual_csv, last_csv, separator, pk, date_field, update_payload,
+                n_partitions=n_partitions,
+                chunksize=chunksize,
+                max_change_ratio=max_change_ratio if guardrail_enabled else None,
+                sample_size=sample_size,
+                quality=quality,
+                work_dir=dir_cdc
+            )
+            # PK ausente: o guardrail disparou sem ler nenhuma partição
+            if df_cdc is None and quality is not None and "partitions_checked" not in quality:
+                quality = None
+        else:
+            df_actual = read_snapshot(actual_csv, separator)
+            record_memory_ratio(dirs["memory_stats"], table_name, df_actual, actual_csv)
+            df_last = read_snapshot(last_csv, separator)
+            
+            # Guardrail: se quase tudo mudou, o diff custa mais do que economiza
+            if guardrail_enabled:
+                change_ratio = estimate_change_ratio(df_actual, df_last, pk, sample_size)
+            
+            if change_ratio is not None and change_ratio > max_change_ratio:
+                df_cdc = None
+                # Sem diff: as estatísticas vêm dos DataFrames já lidos para a estimativa
+                if quality is not None and all(c in df_actual.columns for c in get_pk_columns(pk)):
+                    add_pk_key(df_actual, pk)
+                    update_quality_stats(quality, df_actual, df_last, pk, date_field)
+                else:
+                    quality = None
+            else:
+                # Gera CDC (IMPORTANTE: ordem correta é df_actual, df_last)
+                df_cdc = create_cdc(df_actual, df_last, pk, date_field, update_payload, quality)
+        
+        if change_ratio is not None:
+            manifest_entry["estimated_change_ratio"] = round(change_ratio, 4)
+        
+        # Relatório de qualidade calculado durante o diff (ou, se o guardrail
+        # disparou, sobre os DataFrames lidos para a estimativa)
+        if quality is not None:
+            report = evaluate_quality(quality, get_quality_thresholds(config, table))
+            manifest_entry["quality"] = report
+            if report["status"] == "fail":
+                logger.error(
+                    f"Verificações de qualidade falharam para {table_name}: "
+                    f"{'; '.join(report['violations'])}. CDC não publicado."
+                )
+                return manifest_entry, False, None
+            if report["status"] == "warn":
+                logger.warning(f"Alertas de qualidade em {table_name}: {'; '.join(report['violations'])}")
+        
+        if df_cdc is None:
+            logger.warning(
+                f"Taxa de mudança estimada para {table_name} ({change_ratio:.1%}) "
+                f"acima do limite ({max_change_ratio:.1%}). "
+                f"CDC não gerado; tabela marcada como full-replace."
+            )
+            manifest_entry["mode"] = "full_replace"
+            manifest_entry["full_load_key"] = (
+                f"{prefix}/full-load/{table_name}/{table_name}.parquet"
+            )
+            record = functools.partial(
+                register_full_replace, dirs["catalog"], table_name, run_id, pk, get_snapshot_path(dirs)
+            )
+            if pending_catalog is None:
+                record()
+            else:
+                pending_catalog.append(record)
+            return manifest_entry, True, None
+        
+        # Se não houver mudanças, pula
+        if df_cdc.empty:
+            logger.info(f"Nenhuma alteração detectada para {table_name}")
+            manifest_entry["mode"] = "no_changes"
+            return manifest_entry, True, None
+        
+        # Adiciona coluna DtAtualizacao se não existir (para compatibilidade com PySpark)
+        if 'DtAtualizacao' not in df_cdc.columns:
+            df_cdc['DtAtualizacao'] = datetime.datetime.now()
+            logger.debug("Coluna DtAtualizacao adicionada em %s", table_name)
+        
+        # Gera timestamp para o nome do arquivo
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        cdc_filename = f"{table_name}_{timestamp}.parquet"
+        cdc_path = dir_cdc / cdc_filename
+        
+        # Salva CDC como Parquet
+        df_cdc.to_parquet(cdc_path, index=False, engine='pyarrow')
+        logger.debug("CDC Parquet criado: %s", cdc_path)
+        
+        # Chave S3 para CDC
+        s3_key = f"{prefix}/cdc/{table_name}/{cdc_filename}"
+        
+        manifest_entry.update({
+            "mode": "cdc",
+            "cdc_file": cdc_filename,
+            "rows": len(df_cdc)
+        })
+        # O registro só precisa de 'op' e das colunas de PK
+        catalog_cols = ["op"] + list(dict.fromkeys(get_pk_columns(pk) + [get_key_column(pk)]))
+        record = functools.partial(
+            register_cdc_file, dirs["catalog"], table_name, run_id,
+            cdc_path, df_cdc[catalog_cols], pk, s3_key, get_snapshot_path(dirs)
+        )
+        if pending_catalog is None:
+            record()
+        else:
+            pending_catalog.append(record)
+        logger.info(f"CDC processado com sucesso: {table_name}")
+        
+        return manifest_entry, True, (cdc_path, s3_key)
+        
+    except Exception as e:
+        logger.error(f"Erro ao processar CDC de {table_name}: {e}", exc_info=True)
+        return manifest_entry, False, None
+    finally:
+        budget.release(reserved_mb)
+
+
+def process_cdc(config: Dict, s3_client=None, budget: Optional[MemoryBudget] = None) -> bool:
     """
     Processa o CDC de todas as tabelas:
     1. Compara snapshots atual e anterior
     2. Gera arquivo CDC em Parquet
     3. Faz upload para S3 em cdc/
+    4. Registra o resultado de cada tabela no manifesto do ciclo
+    
+    Se a taxa de mudança estimada de uma tabela passar do limite configurado
+    em 'guardrail', o CDC não é gerado e a tabela é marcada como
+    'full_replace' no manifesto (o consumidor deve recarregar o full-load).
     
     Args:
         config: Dicionário de configuração
         s3_client: Cliente S3 (opcional)
+        budget: Orçamento de memória compartilhado (opcional)
         
     Returns:
         True se todos os CDCs foram processados com sucesso, False caso contrário
@@ -511,190 +2161,848 @@ def process_cdc(config: Dict, s3_client=None) -> bool:
     bucket = config["aws"]["bucket"]
     prefix = config["aws"]["prefix"]
     tables = config["tables"]
+    dirs = get_data_dirs(config)
+    
+    run_id = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    manifest_tables = {}
     
     success = True
     
     for table in tables:
-        table_name = table["name"]
-        separator = table["sep"]
-        pk = table["pk"]
-        date_field = table["date_field"]
+        manifest_entry, ok, upload = prepare_cdc(config, table, dirs, run_id, budget)
+        manifest_tables[table["name"]] = manifest_entry
+        if not config.get("base_snapshot"):
+            update_snapshot_hold(dirs, table["name"], ok)
         
-        try:
-            logger.info(f"Processando CDC: {table_name}")
-            
-            # Caminhos dos arquivos
-            actual_csv = DIR_ACTUAL / f"{table_name}.csv"
-            last_csv = DIR_LAST / f"{table_name}.csv"
-            
-            if not actual_csv.exists():
-                logger.warning(f"Snapshot atual não encontrado: {actual_csv}")
-                success = False
-                continue
-            
-            # Lê snapshot atual
-            df_actual = pd.read_csv(actual_csv, sep=separator)
-            
-            # Remove coluna 'op' se existir (de execuções anteriores)
-            if 'op' in df_actual.columns:
-                df_actual = df_actual.drop(columns=['op'])
-            
-            # Verifica se existe snapshot anterior
-            if not last_csv.exists():
-                logger.warning(
-                    f"Snapshot anterior não encontrado para {table_name}. "
-                    f"Todas as {len(df_actual)} linhas serão consideradas inserções."
+        if not ok:
+            success = False
+        
+        # Upload para S3
+        if upload is not None and not upload_to_s3(str(upload[0]), bucket, upload[1], s3_client):
+            success = False
+    
+    if not write_cdc_manifest(run_id, manifest_tables, bucket, prefix, s3_client, dirs):
+        success = False
+    
+    if success:
+        logger.info("CDC concluído com sucesso para todas as tabelas")
+    else:
+        logger.warning("CDC concluído com alguns erros")
+    
+    return success
+
+
+def write_cdc_manifest(
+    run_id: str,
+    manifest_tables: Dict,
+    bucket: str,
+    prefix: str,
+    s3_client=None,
+    dirs: Optional[Dict[str, Path]] = None
+) -> bool:
+    """
+    Grava o manifesto do ciclo no diretório cdc do dataset e faz upload para S3 em cdc/_manifests/.
+
+    O manifesto informa, por tabela, o modo do ciclo:
+        cdc: arquivo CDC gerado ('cdc_file')
+        full_replace: CDC omitido; recarregar o full-load ('full_load_key')
+        no_changes: nenhuma alteração detectada
+        error: falha no processamento
+    
+    Args:
+        run_id: Identificador do ciclo (timestamp YYYYMMDD_HHMMSS)
+        manifest_tables: Dicionário {tabela: entrada do manifesto}
+        bucket: Nome do bucket S3
+        prefix: Prefixo no bucket
+        s3_client: Cliente S3 (opcional)
+        dirs: Diretórios do dataset (ver get_data_dirs; padrão: ./data/)
+        
+    Returns:
+        True se o manifesto foi gravado e enviado, False caso contrário
+    """
+    manifest = {
+        "run_id": run_id,
+        "created_at": datetime.datetime.now().isoformat(),
+        "tables": manifest_tables
+    }
+    manifest_filename = f"manifest_{run_id}.json"
+    manifest_path = (dirs or get_data_dirs({}))["cdc"] / manifest_filename
+    
+    try:
+        with open(manifest_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False)
+        logger.debug("Manifesto do ciclo criado: %s", manifest_path)
+    except OSError as e:
+        logger.error(f"Erro ao gravar manifesto {manifest_path}: {e}", exc_info=True)
+        return False
+    
+    s3_key = f"{prefix}/cdc/_manifests/{manifest_filename}"
+    return upload_to_s3(str(manifest_path), bucket, s3_key, s3_client)
+
+
+# ==================== CATÁLOGO DE CDC ====================
+
+CATALOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cdc_files (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    table_name TEXT NOT NULL,
+    run_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    file_name TEXT UNIQUE,
+    local_path TEXT,
+    s3_key TEXT,
+    pk_column TEXT,
+    pk_kind TEXT,
+    pk_min,
+    pk_max,
+    rows_insert INTEGER DEFAULT 0,
+    rows_update INTEGER DEFAULT 0,
+    rows_delete INTEGER DEFAULT 0,
+    created_at TEXT NOT NULL,
+    snapshot_path TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_cdc_files_table_run ON cdc_files (table_name, run_id);
+"""
+
+
+def open_catalog(catalog_path: Path) -> sqlite3.Connection:
+    """
+    Abre (criando se necessário) o catálogo SQLite de arquivos CDC.
+    
+    Cada linha descreve um arquivo CDC ('kind' = 'cdc') ou um ciclo em que a
+    tabela foi marcada como full-replace ('kind' = 'full_replace'). pk_min e
+    pk_max não têm tipo declarado, então preservam inteiros e textos e são
+    comparados corretamente em consultas por faixa. snapshot_path é o
+    snapshot versionado comparado no ciclo, ou seja, o estado da tabela ao
+    final dele (ponto de partida de rebuild_table).
+    
+    Args:
+        catalog_path: Caminho do arquivo SQLite
+        
+    Returns:
+        Conexão SQLite com row_factory = sqlite3.Row
+    """
+    catalog_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(catalog_path))
+    conn.row_factory = sqlite3.Row
+    conn.executescript(CATALOG_SCHEMA)
+    
+    # Catálogos criados antes do registro de snapshots
+    columns = {row["name"] for row in conn.execute("PRAGMA table_info(cdc_files)")}
+    if "snapshot_path" not in columns:
+        conn.execute("ALTER TABLE cdc_files ADD COLUMN snapshot_path TEXT")
+    return conn
+
+
+def to_catalog_value(value):
+    """
+    Converte um valor de PK (numpy/pandas) para um tipo nativo aceito pelo SQLite.
+    """
+    if value is None or pd.isna(value):
+        return None
+    return value.item() if hasattr(value, "item") else value
+
+
+def register_cdc_file(
+    catalog_path: Path,
+    table_name: str,
+    run_id: str,
+    cdc_path: Path,
+    df_cdc: pd.DataFrame,
+    pk,
+    s3_key: Optional[str] = None,
+    snapshot_path: Optional[Path] = None
+) -> bool:
+    """
+    Registra um arquivo CDC no catálogo com contagens por operação e faixa de PK.
+    
+    Args:
+        catalog_path: Caminho do catálogo SQLite
+        table_name: Nome da tabela
+        run_id: Identificador do ciclo
+        cdc_path: Arquivo CDC gravado
+        df_cdc: DataFrame gravado em cdc_path
+        pk: Coluna(s) de chave primária (a faixa catalogada é a do primeiro
+            componente quando a PK é composta)
+        s3_key: Chave do arquivo no S3 (opcional)
+        snapshot_path: Snapshot versionado do ciclo (opcional; ver get_snapshot_path)
+        
+    Returns:
+        True se o registro foi gravado, False caso contrário
+    """
+    try:
+        op_counts = df_cdc["op"].value_counts()
+        # A chave codificada de PK composta é um hash e não preserva ordem:
+        # a faixa catalogada é a do primeiro componente
+        pk_values = df_cdc[get_pk_columns(pk)[0]].dropna()
+        
+        with closing(open_catalog(catalog_path)) as conn, conn:
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO cdc_files (
+                    table_name, run_id, kind, file_name, local_path, s3_key,
+                    pk_column, pk_kind, pk_min, pk_max,
+                    rows_insert, rows_update, rows_delete, created_at, snapshot_path
+                ) VALUES (?, ?, 'cdc', ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    table_name, run_id, cdc_path.name, str(cdc_path), s3_key,
+                    ",".join(get_pk_columns(pk)), pk_values.dtype.kind,
+                    to_catalog_value(pk_values.min()) if len(pk_values) else None,
+                    to_catalog_value(pk_values.max()) if len(pk_values) else None,
+                    int(op_counts.get("I", 0)),
+                    int(op_counts.get("U", 0)),
+                    int(op_counts.get("D", 0)),
+                    datetime.datetime.now().isoformat(),
+                    str(snapshot_path) if snapshot_path else None
                 )
-                df_cdc = df_actual.copy()
-                df_cdc["op"] = "I"
-            else:
-                # Lê snapshot anterior
-                df_last = pd.read_csv(last_csv, sep=separator)
-                
-                # Remove coluna 'op' se existir (de execuções anteriores)
-                if 'op' in df_last.columns:
-                    df_last = df_last.drop(columns=['op'])
-                
-                # Gera CDC (IMPORTANTE: ordem correta é df_actual, df_last)
-                df_cdc = create_cdc(df_actual, df_last, pk, date_field)
-            
-            # Se não houver mudanças, pula
-            if df_cdc.empty:
-                logger.info(f"Nenhuma alteração detectada para {table_name}")
-                continue
-            
-            # Adiciona coluna DtAtualizacao se não existir (para compatibilidade com PySpark)
-            if 'DtAtualizacao' not in df_cdc.columns:
-                df_cdc['DtAtualizacao'] = datetime.datetime.now()
-                logger.debug(f"Coluna DtAtualizacao adicionada em {table_name}")
-            
-            # Gera timestamp para o nome do arquivo
-            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            cdc_filename = f"{table_name}_{timestamp}.parquet"
-            cdc_path = DIR_CDC / cdc_filename
-            
-            # Salva CDC como Parquet
-            df_cdc.to_parquet(cdc_path, index=False, engine='pyarrow')
-            logger.debug(f"CDC Parquet criado: {cdc_path}")
-            
-            # Chave S3 para CDC
-            s3_key = f"{prefix}/cdc/{table_name}/{cdc_filename}"
-            
-            # Upload para S3
-            if not upload_to_s3(str(cdc_path), bucket, s3_key, s3_client):
-                success = False
-            
-            logger.info(f"CDC processado com sucesso: {table_name}")
+            )
+        logger.debug("Arquivo CDC registrado no catálogo: %s", cdc_path.name)
+        return True
+        
+    except Exception as e:
+        logger.warning(f"Erro ao registrar {cdc_path.name} no catálogo: {e}")
+        return False
+
+
+def register_full_replace(
+    catalog_path: Path,
+    table_name: str,
+    run_id: str,
+    pk,
+    snapshot_path: Optional[Path] = None
+) -> bool:
+    """
+    Registra no catálogo um ciclo em que a tabela foi marcada como full-replace.
+    
+    Args:
+        catalog_path: Caminho do catálogo SQLite
+        table_name: Nome da tabela
+        run_id: Identificador do ciclo
+        pk: Coluna(s) de chave primária
+        snapshot_path: Snapshot versionado do ciclo (opcional; ver get_snapshot_path)
+        
+    Returns:
+        True se o registro foi gravado, False caso contrário
+    """
+    try:
+        with closing(open_catalog(catalog_path)) as conn, conn:
+            conn.execute(
+                """
+                INSERT INTO cdc_files (table_name, run_id, kind, pk_column, created_at, snapshot_path)
+                VALUES (?, ?, 'full_replace', ?, ?, ?)
+                """,
+                (
+                    table_name, run_id, ",".join(get_pk_columns(pk)),
+                    datetime.datetime.now().isoformat(),
+                    str(snapshot_path) if snapshot_path else None
+                )
+            )
+        return True
+        
+    except Exception as e:
+        logger.warning(f"Erro ao registrar full-replace de {table_name} no catálogo: {e}")
+        return False
+
+
+def get_catalog_index(catalog_path: Path) -> Dict[str, Tuple[str, str]]:
+    """
+    Retorna {nome do arquivo: (tabela, run_id)} para os arquivos CDC catalogados.
+    
+    Args:
+        catalog_path: Caminho do catálogo SQLite
+        
+    Returns:
+        Dicionário vazio se o catálogo não existir
+    """
+    if not catalog_path.exists():
+        return {}
+    
+    with closing(open_catalog(catalog_path)) as conn:
+        rows = conn.execute(
+            "SELECT file_name, table_name, run_id FROM cdc_files WHERE kind = 'cdc'"
+        ).fetchall()
+    
+    return {row["file_name"]: (row["table_name"], row["run_id"]) for row in rows}
+
+
+def mark_cdc_files_removed(catalog_path: Path, file_names: List[str]):
+    """
+    Marca arquivos CDC como removidos localmente (o histórico no catálogo é mantido).
+    
+    Args:
+        catalog_path: Caminho do catálogo SQLite
+        file_names: Nomes dos arquivos removidos
+    """
+    if not file_names or not catalog_path.exists():
+        return
+    
+    with closing(open_catalog(catalog_path)) as conn, conn:
+        conn.executemany(
+            "UPDATE cdc_files SET local_path = NULL WHERE file_name = ?",
+            [(name,) for name in file_names]
+        )
+
+
+def get_rebuild_base_runs(catalog_path: Path) -> Dict[str, str]:
+    """
+    Retorna {tabela: run_id} do ciclo mais antigo cujo snapshot ainda está no disco.
+    
+    Reconstruções a partir desse ciclo precisam de todos os arquivos CDC
+    posteriores (ver rebuild_table), por isso cleanup_local_cdc os preserva.
+    
+    Args:
+        catalog_path: Caminho do catálogo SQLite
+        
+    Returns:
+        Dicionário vazio se o catálogo não existir
+    """
+    if not catalog_path.exists():
+        return {}
+    
+    with closing(open_catalog(catalog_path)) as conn:
+        rows = conn.execute(
+            "SELECT table_name, run_id, snapshot_path FROM cdc_files "
+            "WHERE snapshot_path IS NOT NULL ORDER BY run_id"
+        ).fetchall()
+    
+    base_runs = {}
+    for row in rows:
+        if row["table_name"] not in base_runs and (
+            Path(row["snapshot_path"]) / f"{row['table_name']}.csv"
+        ).exists():
+            base_runs[row["table_name"]] = row["run_id"]
+    return base_runs
+
+
+def find_catalog_entries(
+    catalog_path: Path,
+    table_name: str,
+    as_of_run: Optional[str] = None,
+    pk_range: Optional[Tuple] = None
+) -> List[sqlite3.Row]:
+    """
+    Lista as entradas do catálogo de uma tabela em ordem de ciclo.
+    
+    Args:
+        catalog_path: Caminho do catálogo SQLite
+        table_name: Nome da tabela
+        as_of_run: Considera apenas ciclos até este run_id (inclusive)
+        pk_range: Tupla (mínimo, máximo); arquivos CDC cuja faixa de PK não
+            intersecta são ignorados (entradas full_replace são sempre retornadas)
             
-        except Exception as e:
-            logger.error(f"Erro ao processar CDC de {table_name}: {e}", exc_info=True)
-            success = False
+    Returns:
+        Lista de linhas do catálogo
+    """
+    query = "SELECT * FROM cdc_files WHERE table_name = ?"
+    params = [table_name]
+    
+    if as_of_run:
+        query += " AND run_id <= ?"
+        params.append(as_of_run)
+    
+    if pk_range is not None:
+        query += " AND (kind = 'full_replace' OR (pk_min <= ? AND pk_max >= ?))"
+        params.extend([pk_range[1], pk_range[0]])
+    
+    query += " ORDER BY run_id, id"
+    
+    with closing(open_catalog(catalog_path)) as conn:
+        return conn.execute(query, params).fetchall()
+
+
+def get_catalog_key(catalog_path: Path, table_name: str) -> Optional[sqlite3.Row]:
+    """
+    Retorna a coluna de PK e seu tipo (dtype.kind) no CDC mais recente catalogado da tabela.
+    
+    PKs compostas são catalogadas como as colunas separadas por vírgula, com
+    o tipo do primeiro componente.
+    """
+    with closing(open_catalog(catalog_path)) as conn:
+        return conn.execute(
+            "SELECT pk_column, pk_kind FROM cdc_files "
+            "WHERE table_name = ? AND kind = 'cdc' ORDER BY run_id DESC LIMIT 1",
+            (table_name,)
+        ).fetchone()
+
+
+def cast_pk_value(value: str, pk_kind: Optional[str], pk_columns: Optional[List[str]] = None):
+    """
+    Converte uma PK informada como texto (ex.: na linha de comando) para o tipo catalogado.
+    
+    Para PK composta, 'value' traz os componentes separados por vírgula
+    (ex.: '10,3') e o retorno é a chave codificada (ver encode_pk).
+    """
+    if pk_columns and len(pk_columns) > 1:
+        parts = value.split(",")
+        if len(parts) != len(pk_columns):
+            raise ValueError(f"PK composta {pk_columns} requer {len(pk_columns)} valores: {value}")
+        row = pd.DataFrame([[parse_scalar(part) for part in parts]], columns=pk_columns)
+        return int(encode_pk(row, pk_columns).iloc[0])
+    if pk_kind in ("i", "u"):
+        return int(value)
+    if pk_kind == "f":
+        return float(value)
+    return value
+
+
+def get_pk_prune_value(value, pk_kind: Optional[str], pk_columns: Optional[List[str]] = None):
+    """
+    Retorna o valor comparado com a faixa de PK catalogada (pk_min/pk_max).
+    
+    Para PK composta a faixa é a do primeiro componente, então só ele é usado;
+    uma chave já codificada não permite poda e retorna None.
+    """
+    if pk_columns and len(pk_columns) > 1:
+        if not isinstance(value, str):
+            return None
+        return cast_pk_value(value.split(",")[0], pk_kind)
+    return cast_pk_value(value, pk_kind) if isinstance(value, str) else value
+
+
+def parse_scalar(value: str):
+    """
+    Converte texto em int ou float quando possível (mesma inferência do read_csv).
+    """
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    return value
+
+
+def apply_cdc(state: pd.DataFrame, df_cdc: pd.DataFrame, pk: str) -> pd.DataFrame:
+    """
+    Aplica um arquivo CDC sobre o estado de uma tabela (indexado pela PK).
+    
+    Linhas 'U' com 'changed_cols' (payloads changed_columns/sparse) atualizam
+    apenas os campos listados; as demais substituem a linha inteira.
+    
+    Args:
+        state: Estado atual da tabela, indexado pela PK
+        df_cdc: Conteúdo do arquivo CDC
+        pk: Nome da coluna de chave primária
+        
+    Returns:
+        Novo estado da tabela
+    """
+    data_cols = [c for c in df_cdc.columns if c not in (pk, "op", "changed_cols")]
+    df_cdc = df_cdc.set_index(pk)
+    
+    deleted = df_cdc.index[df_cdc["op"] == "D"]
+    state = state.drop(index=deleted, errors="ignore")
+    
+    is_partial = df_cdc["changed_cols"].notna() if "changed_cols" in df_cdc.columns else None
+    full_rows = df_cdc["op"] == "I"
+    if is_partial is None:
+        full_rows |= df_cdc["op"] == "U"
+    else:
+        full_rows |= (df_cdc["op"] == "U") & ~is_partial
+    
+    upserts = df_cdc.loc[full_rows, data_cols]
+    if not upserts.empty:
+        remaining = state.drop(index=upserts.index, errors="ignore")
+        state = pd.concat([remaining, upserts]) if not remaining.empty else upserts
+    
+    if is_partial is not None:
+        partial = df_cdc[(df_cdc["op"] == "U") & is_partial]
+        for pk_value, row in partial.iterrows():
+            for col in row["changed_cols"]:
+                state.loc[pk_value, col] = row[col]
+    
+    return state
+
+
+def find_rebuild_start(entries: List[sqlite3.Row], table_name: str) -> Optional[Tuple[int, bool]]:
+    """
+    Escolhe o ponto de partida de uma reconstrução no histórico de uma tabela.
+    
+    O histórico é percorrido do fim para o começo: o primeiro ciclo cujo
+    snapshot ainda está no disco serve de base. Um full_replace sem snapshot
+    interrompe a busca (o CDC não cobre esse ciclo); sem snapshot algum, a
+    base é o primeiro CDC catalogado.
+    
+    Args:
+        entries: Entradas do catálogo em ordem de ciclo (ver find_catalog_entries)
+        table_name: Nome da tabela
+        
+    Returns:
+        Tupla (índice da entrada, se a base é o snapshot dela), ou None se
+        nenhuma base é possível
+    """
+    for index in range(len(entries) - 1, -1, -1):
+        entry = entries[index]
+        if entry["snapshot_path"] and (Path(entry["snapshot_path"]) / f"{table_name}.csv").exists():
+            return index, True
+        if entry["kind"] == "full_replace":
+            return None
+    return 0, False
+
+
+def rebuild_table(
+    catalog_path: Path,
+    table_name: str,
+    as_of_run: Optional[str] = None,
+    pks: Optional[List] = None,
+    separator: str = ";"
+) -> Optional[pd.DataFrame]:
+    """
+    Reconstrói uma tabela como estava ao final de um ciclo.
+    
+    A base é o snapshot retido mais recente até o ciclo alvo (o snapshot de
+    um ciclo é o estado da tabela ao final dele, inclusive em full_replace);
+    só os arquivos CDC posteriores a ele são reaplicados. Sem snapshot
+    retido, o histórico precisa começar em um CDC só de inserções (primeiro
+    ciclo) e não pode atravessar ciclos full_replace. Com 'pks', só são
+    abertos os arquivos cuja faixa de PK contém esses valores (em PK
+    composta, a faixa do primeiro componente).
+    
+    Args:
+        catalog_path: Caminho do catálogo SQLite
+        table_name: Nome da tabela
+        as_of_run: run_id alvo (padrão: último ciclo catalogado)
+        pks: Restringe a reconstrução a estas PKs (opcional; texto é
+            convertido para o tipo catalogado)
+        separator: Separador do CSV do snapshot usado como base
+        
+    Returns:
+        DataFrame reconstruído, ou None se o histórico local estiver incompleto
+    """
+    pk_range = None
+    if pks:
+        key_info = get_catalog_key(catalog_path, table_name)
+        pk_kind = key_info["pk_kind"] if key_info else None
+        pk_columns = key_info["pk_column"].split(",") if key_info else None
+        prune_values = [get_pk_prune_value(v, pk_kind, pk_columns) for v in pks]
+        if None not in prune_values:
+            pk_range = (min(prune_values), max(prune_values))
+        pks = [cast_pk_value(v, pk_kind, pk_columns) if isinstance(v, str) else v for v in pks]
+    
+    entries = find_catalog_entries(catalog_path, table_name, as_of_run)
+    
+    if not entries:
+        logger.error(f"Nenhum CDC catalogado para {table_name} até {as_of_run or 'o último ciclo'}")
+        return None
+    
+    start = find_rebuild_start(entries, table_name)
+    if start is None:
+        full_replaces = [e["run_id"] for e in entries if e["kind"] == "full_replace"]
+        logger.error(
+            f"Ciclo full-replace {full_replaces[-1]} sem snapshot retido: o histórico de "
+            f"{table_name} até {entries[-1]['run_id']} não pode ser reconstruído"
+        )
+        return None
+    
+    start_index, from_snapshot = start
+    base = entries[start_index]
+    to_apply = entries[start_index + 1:] if from_snapshot else entries[start_index:]
+    
+    if pk_range is not None:
+        # Só abre os arquivos cuja faixa de PK contém os valores pedidos
+        in_range = {e["id"] for e in find_catalog_entries(catalog_path, table_name, as_of_run, pk_range)}
+        to_apply = [e for e in to_apply if e["id"] in in_range]
+    
+    missing = [e["file_name"] for e in to_apply if not e["local_path"] or not Path(e["local_path"]).exists()]
+    if missing:
+        logger.error(f"Arquivos CDC ausentes localmente para {table_name}: {missing}")
+        return None
+    
+    pk_columns = base["pk_column"].split(",")
+    pk = get_key_column(pk_columns)
+    filters = [(pk, "in", list(pks))] if pks else None
+    state = None
+    
+    if from_snapshot:
+        # Estado inicial: snapshot retido do ciclo base
+        snapshot = read_snapshot(Path(base["snapshot_path"]) / f"{table_name}.csv", separator)
+        add_pk_key(snapshot, pk_columns)
+        if pks:
+            snapshot = snapshot[snapshot[pk].isin(pks)]
+        state = snapshot.set_index(pk)
+        logger.debug("Base da reconstrução: snapshot %s", base["snapshot_path"])
+    elif base["rows_update"] or base["rows_delete"]:
+        logger.warning(
+            f"O primeiro CDC catalogado de {table_name} ({base['file_name']}) não é uma "
+            f"carga inicial; linhas nunca alteradas desde então não aparecem na reconstrução"
+        )
+    
+    for entry in to_apply:
+        df_cdc = pd.read_parquet(entry["local_path"], filters=filters)
+        if state is None:
+            # Estado inicial: inserções do primeiro arquivo, com os dtypes gravados
+            cols = [c for c in df_cdc.columns if c not in (pk, "op", "changed_cols")]
+            state = df_cdc.loc[df_cdc["op"] == "I"].set_index(pk)[cols]
+            df_cdc = df_cdc[df_cdc["op"] != "I"]
+        state = apply_cdc(state, df_cdc, pk)
+        logger.debug("CDC reaplicado: %s", entry["file_name"])
+    
+    # DtAtualizacao acrescentada pelo CDC (compatibilidade com PySpark) não faz
+    # parte de uma tabela cujo snapshot não a tem
+    if from_snapshot and 'DtAtualizacao' not in snapshot.columns:
+        state = state.drop(columns=['DtAtualizacao'], errors="ignore")
+    
+    logger.info(
+        f"{table_name} reconstruída até {entries[-1]['run_id']}: {len(state)} linha(s), "
+        f"{len(to_apply)} arquivo(s) reaplicado(s)"
+        + (f" sobre o snapshot de {base['run_id']}" if from_snapshot else "")
+    )
+    return state.reset_index().drop(columns=[PK_KEY_COLUMN], errors="ignore")
+
+
+def get_pk_history(catalog_path: Path, table_name: str, pk_value) -> pd.DataFrame:
+    """
+    Retorna todas as operações CDC de uma PK, abrindo só os arquivos cuja faixa a contém.
+    
+    Args:
+        catalog_path: Caminho do catálogo SQLite
+        table_name: Nome da tabela
+        pk_value: Valor da PK (texto é convertido para o tipo catalogado;
+            PK composta usa os valores separados por vírgula)
+        
+    Returns:
+        DataFrame com uma linha por operação, acrescido de 'run_id' e 'cdc_file'
+    """
+    key_info = get_catalog_key(catalog_path, table_name)
+    if key_info is None:
+        return pd.DataFrame()
+    
+    pk_columns = key_info["pk_column"].split(",")
+    pk = get_key_column(pk_columns)
+    prune_value = get_pk_prune_value(pk_value, key_info["pk_kind"], pk_columns)
+    pk_range = (prune_value, prune_value) if prune_value is not None else None
+    if isinstance(pk_value, str):
+        pk_value = cast_pk_value(pk_value, key_info["pk_kind"], pk_columns)
+    
+    history = []
+    for entry in find_catalog_entries(catalog_path, table_name, pk_range=pk_range):
+        if entry["kind"] != "cdc":
+            continue
+        if not entry["local_path"] or not Path(entry["local_path"]).exists():
+            logger.warning(f"Arquivo CDC ausente localmente: {entry['file_name']}")
+            continue
+        
+        df = pd.read_parquet(entry["local_path"], filters=[(pk, "==", pk_value)])
+        if not df.empty:
+            df["run_id"] = entry["run_id"]
+            df["cdc_file"] = entry["file_name"]
+            history.append(df)
+    
+    if not history:
+        return pd.DataFrame()
+    return pd.concat(history, ignore_index=True)
+
+
+# ==================== FUNÇÕES DE PÓS-PROCESSAMENTO ====================
+
+def promote_snapshots(dirs: Optional[Dict[str, Path]] = None) -> bool:
+    """
+    Promove o snapshot atual a 'last' para uso no próximo ciclo.
+    
+    A promoção é apenas a troca atômica do ponteiro 'last' (O(1), sem mover
+    arquivos): um crash deixa o ponteiro antigo ou o novo, nunca um
+    diretório last meio atualizado.
+    
+    Args:
+        dirs: Diretórios do dataset (ver get_data_dirs; padrão: ./data/)
+        
+    Returns:
+        True se a promoção foi bem-sucedida, False caso contrário
+    """
+    dirs = dirs or get_data_dirs({})
     
-    if success:
-        logger.info("CDC concluído com sucesso para todas as tabelas")
+    try:
+        pointers = read_snapshot_pointers(dirs["base"])
+        current_dir = dirs["base"] / pointers["current"]
+        
+        if not current_dir.exists() or not any(current_dir.glob("*.csv")):
+            logger.info(f"Nenhum snapshot atual para promover em {current_dir}")
+            return True
+        
+        if pointers["last"] == pointers["current"]:
+            logger.debug("Snapshot %s já é o último promovido", pointers["current"])
+            return True
+        
+        logger.info(f"Promovendo snapshot {pointers['current']} para last")
+        pointers["last"] = pointers["current"]
+        write_snapshot_pointers(dirs["base"], pointers)
+        return True
+        
+    except Exception as e:
+        logger.error(f"Erro ao promover snapshot: {e}", exc_info=True)
+        return False
+
+
+def update_snapshot_hold(dirs: Dict[str, Path], table_name: str, ok: bool):
+    """
+    Retém a base de uma tabela cujo CDC falhou, ou libera a retenção após um sucesso.
+    
+    A promoção troca o 'last' do dataset inteiro: sem a retenção, uma tabela
+    com erro (inclusive falha de qualidade) seria comparada no próximo ciclo
+    contra um snapshot que nunca virou CDC, e as mudanças do ciclo com erro
+    se perderiam. Com ela, a tabela segue comparada contra o último snapshot
+    aceito até um ciclo terminar sem erro, e esse CDC traz as mudanças acumuladas.
+    
+    Args:
+        dirs: Diretórios usados no ciclo (ver get_data_dirs)
+        table_name: Nome da tabela
+        ok: Se o CDC da tabela foi concluído neste ciclo
+    """
+    pointers = read_snapshot_pointers(dirs["base"])
+    held = dict(pointers.get("held", {}))
+    
+    if ok:
+        held.pop(table_name, None)
     else:
-        logger.warning("CDC concluído com alguns erros")
+        base_dir = get_last_csv(dirs, table_name).parent
+        held[table_name] = base_dir.relative_to(dirs["base"]).as_posix()
     
-    return success
-
+    if held == pointers.get("held", {}):
+        return
+    
+    if held:
+        pointers["held"] = held
+    else:
+        pointers.pop("held", None)
+    write_snapshot_pointers(dirs["base"], pointers)
+    if ok:
+        logger.info(f"Base retida de {table_name} liberada")
+    else:
+        logger.warning(f"{table_name} continua comparada contra {held[table_name]} no próximo ciclo")
 
-# ==================== FUNÇÕES DE PÓS-PROCESSAMENTO ====================
 
-def move_snapshots() -> bool:
+def cleanup_snapshots(keep_last_n: int = 3, dirs: Optional[Dict[str, Path]] = None) -> bool:
     """
-    Move arquivos de ./data/actual/ para ./data/last/ para uso no próximo ciclo.
+    Remove snapshots versionados antigos, mantendo os N mais recentes.
+    
+    Snapshots referenciados pelos ponteiros 'current' e 'last' e as bases
+    retidas por tabela ('held') nunca são removidos. Downloads interrompidos (*.partial) também são apagados.
     
+    Args:
+        keep_last_n: Número de snapshots mais recentes a manter (padrão: 3)
+        dirs: Diretórios do dataset (ver get_data_dirs; padrão: ./data/)
+        
     Returns:
-        True se a movimentação foi bem-sucedida, False caso contrário
+        True se a limpeza foi bem-sucedida, False caso contrário
     """
+    dirs = dirs or get_data_dirs({})
+    snapshots_dir = dirs["snapshots"]
+    
     try:
-        logger.info("Movendo snapshots de actual para last")
-        
-        if not DIR_ACTUAL.exists():
-            logger.warning(f"Diretório {DIR_ACTUAL} não existe")
-            return False
+        if not snapshots_dir.exists():
+            return True
         
-        # Cria diretório last se não existir
-        DIR_LAST.mkdir(parents=True, exist_ok=True)
+        pointers = read_snapshot_pointers(dirs["base"])
+        protected = {
+            (dirs["base"] / p).resolve()
+            for p in [pointers["current"], pointers["last"], *pointers.get("held", {}).values()]
+        }
         
-        # Move cada arquivo CSV
-        csv_files = list(DIR_ACTUAL.glob("*.csv"))
+        snapshots = sorted(
+            (d for d in snapshots_dir.iterdir() if d.is_dir()),
+            key=lambda d: d.name,
+            reverse=True
+        )
+        complete = [d for d in snapshots if not d.name.endswith(".partial")]
+        to_remove = [d for d in snapshots if d.name.endswith(".partial")] + complete[keep_last_n:]
         
-        if not csv_files:
-            logger.warning("Nenhum arquivo CSV encontrado em actual")
-            return False
+        total_removed = 0
+        for snapshot in to_remove:
+            if snapshot.resolve() in protected:
+                continue
+            try:
+                shutil.rmtree(snapshot)
+                logger.debug("Snapshot removido: %s", snapshot.name)
+                total_removed += 1
+            except Exception as e:
+                logger.warning(f"Erro ao remover snapshot {snapshot.name}: {e}")
         
-        for csv_file in csv_files:
-            dest = DIR_LAST / csv_file.name
-            
-            # Remove arquivo de destino se existir
-            if dest.exists():
-                dest.unlink()
-            
-            # Move arquivo
-            shutil.move(str(csv_file), str(dest))
-            logger.debug(f"Movido: {csv_file.name}")
+        if total_removed > 0:
+            logger.info(f"Retenção de snapshots: {total_removed} snapshot(s) antigo(s) removido(s)")
         
-        logger.info(f"{len(csv_files)} arquivo(s) movido(s) com sucesso")
         return True
         
     except Exception as e:
-        logger.error(f"Erro ao mover snapshots: {e}", exc_info=True)
+        logger.error(f"Erro ao limpar snapshots: {e}", exc_info=True)
         return False
 
 
-def cleanup_local_cdc(keep_last_n: int = 5) -> bool:
+def cleanup_local_cdc(keep_last_n: int = 5, dirs: Optional[Dict[str, Path]] = None) -> bool:
     """
     Remove arquivos CDC locais antigos, mantendo apenas os N mais recentes de cada tabela.
     
+    Arquivos posteriores ao snapshot retido mais antigo da tabela também são
+    mantidos, pois rebuild_table os reaplica sobre esse snapshot (ver
+    get_rebuild_base_runs).
+    
     Args:
         keep_last_n: Número de arquivos mais recentes a manter por tabela (padrão: 5)
+        dirs: Diretórios do dataset (ver get_data_dirs; padrão: ./data/)
         
     Returns:
         True se a limpeza foi bem-sucedida, False caso contrário
     """
+    dirs = dirs or get_data_dirs({})
+    dir_cdc = dirs["cdc"]
+    
     try:
-        if not DIR_CDC.exists():
-            logger.debug(f"Diretório CDC {DIR_CDC} não existe")
+        if not dir_cdc.exists():
+            logger.debug("Diretório CDC %s não existe", dir_cdc)
             return True
         
-        # Lista todos os arquivos Parquet no diretório CDC
-        cdc_files = list(DIR_CDC.glob("*.parquet"))
+        # Lista todos os arquivos Parquet e manifestos no diretório CDC
+        cdc_files = list(dir_cdc.glob("*.parquet")) + list(dir_cdc.glob("manifest_*.json"))
         
         if not cdc_files:
             logger.debug("Nenhum arquivo CDC local para limpar")
             return True
         
+        # Tabela e ciclo de cada arquivo vêm do catálogo; arquivos fora dele
+        # (manifestos, CDC anteriores ao catálogo) usam o nome tabela_YYYYMMDD_HHMMSS
+        catalog_index = get_catalog_index(dirs["catalog"])
+        base_runs = get_rebuild_base_runs(dirs["catalog"])
+        
         # Agrupa arquivos por tabela
         files_by_table = {}
         for file in cdc_files:
-            # Extrai nome da tabela do nome do arquivo (formato: tabela_YYYYMMDD_HHMMSS.parquet)
-            parts = file.stem.split('_')
-            if len(parts) >= 3:
-                table_name = '_'.join(parts[:-2])  # Suporta nomes com underscore (ex: transacao_produto)
+            if file.name in catalog_index:
+                table_name, run_id = catalog_index[file.name]
             else:
-                table_name = parts[0]
+                parts = file.stem.split('_')
+                if len(parts) >= 3:
+                    table_name = '_'.join(parts[:-2])  # Suporta nomes com underscore (ex: transacao_produto)
+                else:
+                    table_name = parts[0]
+                run_id = '_'.join(parts[-2:])
             
             if table_name not in files_by_table:
                 files_by_table[table_name] = []
-            files_by_table[table_name].append(file)
+            files_by_table[table_name].append((run_id, file))
         
         # Remove arquivos antigos de cada tabela
         total_removed = 0
+        removed_names = []
         for table_name, files in files_by_table.items():
-            # Ordena por data de modificação (mais recente primeiro)
-            files_sorted = sorted(files, key=lambda f: f.stat().st_mtime, reverse=True)
+            # Ordena pelo ciclo (mais recente primeiro)
+            files_sorted = sorted(files, key=lambda f: (f[0], f[1].name), reverse=True)
             
-            # Remove arquivos além dos N mais recentes
-            files_to_remove = files_sorted[keep_last_n:]
+            # Remove arquivos além dos N mais recentes, exceto os necessários às reconstruções
+            base_run = base_runs.get(table_name)
+            files_to_remove = [
+                (run_id, file) for run_id, file in files_sorted[keep_last_n:]
+                if not (file.name in catalog_index and base_run is not None and run_id > base_run)
+            ]
             
-            for file in files_to_remove:
+            for _, file in files_to_remove:
                 try:
                     file.unlink()
-                    logger.debug(f"Removido arquivo CDC local: {file.name}")
+                    logger.debug("Removido arquivo CDC local: %s", file.name)
                     total_removed += 1
+                    removed_names.append(file.name)
                 except Exception as e:
-                    logger.warning(f"Erro ao remover {file.name}: {e}")
+                    logger.warning("Erro ao remover %s: %s", file.name, e)
+        
+        mark_cdc_files_removed(dirs["catalog"], removed_names)
         
         if total_removed > 0:
             logger.info(f"Limpeza CDC local: {total_removed} arquivo(s) antigo(s) removido(s)")
@@ -708,59 +3016,544 @@ def cleanup_local_cdc(keep_last_n: int = 5) -> bool:
         return False
 
 
-# ==================== PIPELINE PRINCIPAL ====================
+# ==================== PLANEJAMENTO (--plan) ====================
+
+# Vazão de upload assumida quando 'plan.upload_mb_per_s' não é configurado
+DEFAULT_UPLOAD_MB_PER_S = 10.0
+
+
+def estimate_parquet_bytes_per_row(df: pd.DataFrame, sample_rows: int = 10000, seed: int = 42) -> float:
+    """
+    Estima o tamanho médio por linha em Parquet gravando uma amostra em memória.
+    
+    Args:
+        df: DataFrame da tabela
+        sample_rows: Linhas amostradas
+        seed: Semente da amostragem
+        
+    Returns:
+        Bytes por linha (0.0 se df estiver vazio)
+    """
+    if df.empty:
+        return 0.0
+    
+    sample = df.sample(n=min(sample_rows, len(df)), random_state=seed)
+    buffer = io.BytesIO()
+    sample.to_parquet(buffer, index=False, engine='pyarrow')
+    return buffer.tell() / len(sample)
+
+
+def count_csv_rows(csv_path: Path, separator: str, chunksize: int = 100000) -> int:
+    """
+    Conta as linhas de um CSV em blocos, lendo só a primeira coluna.
+    """
+    return sum(
+        len(chunk) for chunk in pd.read_csv(csv_path, sep=separator, usecols=[0], chunksize=chunksize)
+    )
+
 
-def run_pipeline(config: Dict, skip_download: bool = False) -> bool:
+def read_snapshot_bucket(
+    csv_path: Path,
+    separator: str,
+    pk,
+    n_buckets: int,
+    chunksize: int = 100000
+) -> pd.DataFrame:
+    """
+    Lê em blocos só as linhas cuja PK cai na partição 0 de 'n_buckets'.
+    
+    É a mesma divisão por hash da PK do CDC particionado (ver
+    get_partition_buckets): uma amostra aleatória que seleciona as mesmas
+    PKs nos dois snapshots, esteja a linha no começo ou no fim do arquivo.
+    """
+    parts = []
+    for chunk in pd.read_csv(csv_path, sep=separator, chunksize=chunksize):
+        if 'op' in chunk.columns:
+            chunk = chunk.drop(columns=['op'])
+        parts.append(chunk[get_partition_buckets(chunk, pk, n_buckets).values == 0])
+    return pd.concat(parts, ignore_index=True) if parts else read_snapshot(csv_path, separator, nrows=0)
+
+
+def estimate_chunked_plan(
+    actual_csv: Path,
+    last_csv: Path,
+    separator: str,
+    pk,
+    sample_size: int = 10000,
+    chunksize: int = 100000
+) -> Tuple[Optional[Dict[str, float]], int, int, float]:
+    """
+    Estima I/U/D e bytes por linha de uma tabela sem carregá-la inteira.
+    
+    Os snapshots são contados em blocos e então amostrados por hash da PK
+    (ver read_snapshot_bucket), com tantas partições quantas forem
+    necessárias para a amostra ter cerca de 'sample_size' linhas. Como a
+    mesma PK cai na mesma partição nos dois snapshots, a amostragem de
+    fingerprints do guardrail é aplicada direto às duas amostras.
+    
+    Args:
+        actual_csv: Snapshot atual
+        last_csv: Snapshot anterior (pode não existir)
+        separator: Separador do CSV
+        pk: Coluna(s) de chave primária
+        sample_size: Linhas amostradas de cada snapshot (aproximado)
+        chunksize: Linhas lidas por bloco
+        
+    Returns:
+        Tupla (frações como em estimate_change_shares ou None, linhas do
+        snapshot atual, linhas do snapshot anterior, bytes por linha)
+    """
+    pk_columns = get_pk_columns(pk)
+    has_last = last_csv.exists()
+    n_actual = count_csv_rows(actual_csv, separator, chunksize)
+    n_last = count_csv_rows(last_csv, separator, chunksize) if has_last else 0
+    
+    columns = get_csv_columns(actual_csv, separator)
+    if has_last:
+        columns = [c for c in columns if c in get_csv_columns(last_csv, separator)]
+    if any(c not in columns for c in pk_columns):
+        logger.warning(f"PK {pk_columns} ausente em um dos snapshots; diff não é confiável")
+        sample_actual = read_snapshot(actual_csv, separator, nrows=sample_size)
+        return None, n_actual, n_last, estimate_parquet_bytes_per_row(sample_actual, sample_size)
+    
+    n_buckets = max(1, math.ceil(max(n_actual, n_last) / sample_size))
+    sample_actual = read_snapshot_bucket(actual_csv, separator, pk, n_buckets, chunksize)
+    bytes_per_row = estimate_parquet_bytes_per_row(sample_actual, sample_size)
+    
+    if not has_last:
+        return {"insert": 1.0, "update": 0.0, "delete": 0.0}, n_actual, 0, bytes_per_row
+    
+    sample_last = read_snapshot_bucket(last_csv, separator, pk, n_buckets, chunksize)
+    shares = estimate_change_shares(sample_actual, sample_last, pk, sample_size)
+    return shares, n_actual, n_last, bytes_per_row
+
+
+def plan_table(
+    config: Dict,
+    table: Dict,
+    dirs: Dict[str, Path],
+    budget: MemoryBudget
+) -> Dict:
+    """
+    Estima o que um ciclo faria com uma tabela, sem gravar nada nem acessar o S3.
+    
+    Compara o snapshot atual com o anterior (o mesmo par usado por
+    --skip-download): volumes de I/U/D vêm da amostragem de fingerprints
+    do guardrail, e os tamanhos de Parquet de uma amostra gravada em memória.
+    
+    Tabelas que seriam processadas em partições não são carregadas inteiras:
+    a amostra é uma partição por hash da PK de cada snapshot (ver
+    estimate_chunked_plan).
+    
+    Args:
+        config: Configuração do dataset
+        table: Configuração da tabela
+        dirs: Diretórios do dataset (ver get_data_dirs)
+        budget: Orçamento de memória usado para prever o modo de admissão
+        
+    Returns:
+        Dicionário com as estimativas da tabela
+    """
+    table_name = table["name"]
+    separator = table["sep"]
+    pk = table["pk"]
+    actual_csv = dirs["actual"] / f"{table_name}.csv"
+    last_csv = get_last_csv(dirs, table_name)
+    
+    workers = config.get("workers", {})
+    guardrail = config.get("guardrail", {})
+    sample_size = guardrail.get("sample_size", 10000)
+    max_change_ratio = table.get("max_change_ratio", guardrail.get("max_change_ratio", 0.5))
+    upload_mb_per_s = config.get("plan", {}).get("upload_mb_per_s", DEFAULT_UPLOAD_MB_PER_S)
+    
+    entry = {"table": table_name}
+    
+    if not actual_csv.exists():
+        logger.warning(f"Snapshot atual não encontrado: {actual_csv}")
+        entry["mode"] = "missing"
+        return entry
+    
+    expansion_ratio = get_memory_ratio(
+        dirs["memory_stats"], table_name,
+        workers.get("memory_expansion_factor", DEFAULT_MEMORY_EXPANSION_FACTOR)
+    )
+    estimate_mb = estimate_memory_mb([actual_csv, last_csv], expansion_ratio) * CDC_PEAK_FACTOR
+    admission, n_partitions = plan_table_admission(estimate_mb, budget)
+    
+    if admission == "chunked":
+        shares, n_actual, n_last, bytes_per_row = estimate_chunked_plan(
+            actual_csv, last_csv, separator, pk, sample_size, workers.get("chunksize", 100000)
+        )
+    else:
+        df_actual = read_snapshot(actual_csv, separator)
+        n_actual = len(df_actual)
+        bytes_per_row = estimate_parquet_bytes_per_row(df_actual, sample_size)
+        
+        if last_csv.exists():
+            df_last = read_snapshot(last_csv, separator)
+            n_last = len(df_last)
+            shares = estimate_change_shares(df_actual, df_last, pk, sample_size)
+            del df_last
+        else:
+            n_last = 0
+            shares = {"insert": 1.0, "update": 0.0, "delete": 0.0}
+    
+    if shares is None:
+        shares = {"insert": 1.0, "update": 0.0, "delete": 1.0}
+    
+    inserts = round(shares["insert"] * n_actual)
+    updates = round(shares["update"] * n_actual)
+    deletes = round(shares["delete"] * n_last)
+    change_ratio = min((inserts + updates + deletes) / max(n_actual, n_last, 1), 1.0)
+    
+    if not n_last:
+        mode = "initial"
+    elif guardrail.get("enabled", False) and change_ratio > max_change_ratio:
+        mode = "full_replace"
+    else:
+        mode = "cdc"
+    
+    full_load_bytes = bytes_per_row * n_actual
+    cdc_bytes = 0.0 if mode == "full_replace" else bytes_per_row * (inserts + updates + deletes)
+    upload_bytes = full_load_bytes + cdc_bytes
+    
+    entry.update({
+        "mode": mode,
+        "admission": admission if n_partitions == 1 else f"{admission} x{n_partitions}",
+        "memory_mb": round(estimate_mb, 1),
+        "rows_actual": n_actual,
+        "rows_last": n_last,
+        "inserts": inserts,
+        "updates": updates,
+        "deletes": deletes,
+        "change_ratio": round(change_ratio, 4),
+        "full_load_mb": round(full_load_bytes / 1024 ** 2, 2),
+        "cdc_mb": round(cdc_bytes / 1024 ** 2, 2),
+        "upload_mb": round(upload_bytes / 1024 ** 2, 2),
+        "upload_s": round(upload_bytes / 1024 ** 2 / upload_mb_per_s, 1)
+    })
+    return entry
+
+
+def run_plan(config: Dict, dataset: Optional[str] = None) -> bool:
     """
-    Executa o pipeline completo de CDC.
+    Mostra o plano de um ciclo (--plan) para cada tabela, sem downloads,
+    promoção de snapshots, gravações locais ou chamadas ao S3.
     
     Args:
         config: Dicionário de configuração
+        dataset: Restringe o plano a um dataset (opcional)
+        
+    Returns:
+        True se o plano foi gerado, False caso contrário
+    """
+    datasets = expand_datasets(config)
+    if dataset:
+        datasets = [d for d in datasets if d["name"] == dataset]
+    if not datasets:
+        logger.error(f"Dataset não encontrado: {dataset}")
+        return False
+    
+    budget = MemoryBudget(config.get("workers", {}).get("memory_budget_mb"))
+    rows = []
+    
+    for dataset_config in datasets:
+        dirs = get_data_dirs(dataset_config)
+        logger.info(
+            f"Plano de {dataset_config['name']}: {dirs['actual']} contra {dirs['last']}"
+        )
+        for table in dataset_config["tables"]:
+            entry = plan_table(dataset_config, table, dirs, budget)
+            rows.append({"dataset": dataset_config["name"], **entry})
+    
+    df_plan = pd.DataFrame(rows, dtype=object)
+    print(df_plan.to_string(index=False, na_rep="-"))
+    
+    if "upload_mb" in df_plan.columns:
+        logger.info(
+            f"Total projetado: {df_plan['upload_mb'].sum():.2f} MB de upload, "
+            f"~{df_plan['upload_s'].sum():.0f} s a "
+            f"{config.get('plan', {}).get('upload_mb_per_s', DEFAULT_UPLOAD_MB_PER_S)} MB/s"
+        )
+    return True
+
+
+# ==================== PIPELINE PRINCIPAL ====================
+
+async def run_tables_async(
+    config: Dict,
+    skip_download: bool = False,
+    s3_client=None,
+    budget: Optional[MemoryBudget] = None
+) -> bool:
+    """
+    Executa download, full-load, CDC e upload das tabelas de forma sobreposta.
+    
+    Três estágios ligados por filas limitadas (backpressure):
+    1. Download: baixa cada arquivo do Kaggle assim que há vaga
+       (async_io.download_concurrency) para um snapshot parcial
+    2. Processamento: assim que o CSV de uma tabela chega, gera o Parquet de
+       full-load e o CDC (um por vez, pois é trabalho de CPU)
+    3. Upload: envia os Parquets ao S3 (async_io.upload_concurrency) enquanto
+       a próxima tabela é processada
+    
+    Nada é publicado antes de todos os downloads terminarem: os uploads
+    aguardam essa barreira e os registros no catálogo só são gravados no
+    final. Se algum download falhar, os arquivos gerados são descartados
+    junto com o snapshot parcial, nenhum Parquet é enviado e o manifesto
+    marca todas as tabelas como 'error'; o próximo ciclo refaz o diff contra
+    o mesmo snapshot anterior sem duplicar mudanças.
+    
+    Args:
+        config: Configuração do dataset (ver expand_datasets)
+        skip_download: Se True, processa o snapshot atual sem baixar
+        s3_client: Cliente S3 (opcional)
+        budget: Orçamento de memória compartilhado (opcional)
+        
+    Returns:
+        True se todas as etapas foram bem-sucedidas, False caso contrário
+    """
+    if s3_client is None:
+        s3_client = get_s3_client()
+    
+    async_config = config.get("async_io", {})
+    download_concurrency = async_config.get("download_concurrency", 2)
+    upload_concurrency = async_config.get("upload_concurrency", 4)
+    queue_size = async_config.get("queue_size", 2)
+    
+    bucket = config["aws"]["bucket"]
+    dataset_name = config["dataset_name"]
+    tables = config["tables"]
+    dirs = get_data_dirs(config)
+    
+    run_id = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    manifest_tables = {}
+    pending_catalog = []
+    failures = []
+    failed_downloads = []
+    
+    # Fila de tabelas prontas para processar e fila de arquivos prontos para upload
+    ready_queue = asyncio.Queue(maxsize=queue_size)
+    upload_queue = asyncio.Queue(maxsize=queue_size)
+    
+    # Barreira: liberada quando todos os arquivos terminaram de baixar (com ou sem falha)
+    downloads_done = asyncio.Event()
+    pending_downloads = len(tables)
+    
+    if skip_download:
+        logger.info("Download pulado (skip_download=True)")
+        table_dirs = dirs
+    else:
+        snapshot_dir, partial_dir = new_snapshot_dirs(dirs)
+        partial_dir.mkdir(parents=True, exist_ok=True)
+        # Processa direto do snapshot parcial; ele só é publicado no final
+        table_dirs = dict(dirs, actual=partial_dir)
+        api = await asyncio.to_thread(get_kaggle_api)
+        logger.info(f"Iniciando download do dataset: {dataset_name} (por arquivo)")
+    
+    download_slots = asyncio.Semaphore(download_concurrency)
+    
+    async def download(table: Dict):
+        nonlocal pending_downloads
+        ok = True
+        if not skip_download:
+            file_name = f"{table['name']}.csv"
+            async with download_slots:
+                ok = await asyncio.to_thread(
+                    download_table_file, api, dataset_name, file_name, partial_dir
+                )
+        
+        pending_downloads -= 1
+        if not ok:
+            failed_downloads.append(table["name"])
+        if pending_downloads == 0:
+            downloads_done.set()
+        
+        if ok:
+            await ready_queue.put(table)
+    
+    async def downloader():
+        try:
+            await asyncio.gather(*(download(table) for table in tables))
+        finally:
+            downloads_done.set()
+            await ready_queue.put(None)
+    
+    async def processor():
+        try:
+            while True:
+                table = await ready_queue.get()
+                if table is None:
+                    break
+                table_name = table["name"]
+                
+                # Ciclo já condenado por falha de download: não gasta CPU
+                if failed_downloads:
+                    continue
+                
+                result = await asyncio.to_thread(
+                    prepare_full_load, config, table, table_dirs, budget
+                )
+                if result is None:
+                    failures.append(f"full-load:{table_name}")
+                else:
+                    await upload_queue.put((result[0], result[1], True))
+                
+                manifest_entry, ok, upload = await asyncio.to_thread(
+                    prepare_cdc, config, table, table_dirs, run_id, budget, pending_catalog
+                )
+                manifest_tables[table_name] = manifest_entry
+                if not config.get("base_snapshot"):
+                    pending_catalog.append(
+                        functools.partial(update_snapshot_hold, dirs, table_name, ok)
+                    )
+                if not ok:
+                    failures.append(f"cdc:{table_name}")
+                if upload is not None:
+                    await upload_queue.put((upload[0], upload[1], False))
+        finally:
+            for _ in range(upload_concurrency):
+                await upload_queue.put(None)
+    
+    async def uploader():
+        while True:
+            job = await upload_queue.get()
+            if job is None:
+                break
+            local_path, s3_key, temporary = job
+            
+            await downloads_done.wait()
+            if failed_downloads:
+                # Snapshot será descartado: o arquivo gerado não pode ser publicado
+                local_path.unlink(missing_ok=True)
+                logger.debug("Arquivo descartado sem upload: %s", local_path)
+                continue
+            
+            if not await asyncio.to_thread(upload_to_s3, str(local_path), bucket, s3_key, s3_client):
+                failures.append(f"upload:{s3_key}")
+            if temporary:
+                # Parquet de full-load é temporário
+                local_path.unlink()
+                logger.debug("Arquivo temporário removido: %s", local_path)
+    
+    await asyncio.gather(
+        downloader(),
+        processor(),
+        *(uploader() for _ in range(upload_concurrency))
+    )
+    
+    if failed_downloads:
+        logger.error(
+            f"Falha no download de {', '.join(failed_downloads)} ({dataset_name}); "
+            f"snapshot descartado e nenhum arquivo publicado"
+        )
+        failures.extend(f"download:{name}" for name in failed_downloads)
+        for table in tables:
+            reason = "download_failed" if table["name"] in failed_downloads else "snapshot_discarded"
+            manifest_tables[table["name"]] = {"mode": "error", "error": reason}
+    else:
+        for record in pending_catalog:
+            await asyncio.to_thread(record)
+        # Toda tabela configurada aparece no manifesto
+        for table in tables:
+            manifest_tables.setdefault(table["name"], {"mode": "error"})
+    
+    if not await asyncio.to_thread(
+        write_cdc_manifest, run_id, manifest_tables, bucket, config["aws"]["prefix"], s3_client, dirs
+    ):
+        failures.append("manifest")
+    
+    if not skip_download:
+        if failed_downloads:
+            shutil.rmtree(partial_dir, ignore_errors=True)
+        else:
+            publish_snapshot(dirs, snapshot_dir, partial_dir)
+            logger.info(f"Download concluído: {dataset_name} (snapshot {snapshot_dir.name})")
+    
+    if failures:
+        logger.warning(f"Pipeline assíncrono concluído com erros: {', '.join(failures)}")
+        return False
+    
+    logger.info("Full-load e CDC concluídos com sucesso para todas as tabelas")
+    return True
+
+
+def run_pipeline(
+    config: Dict,
+    skip_download: bool = False,
+    s3_client=None,
+    budget: Optional[MemoryBudget] = None
+) -> bool:
+    """
+    Executa o pipeline completo de CDC para um dataset.
+    
+    Args:
+        config: Configuração do dataset (ver expand_datasets)
         skip_download: Se True, pula o download (útil para testes)
+        s3_client: Cliente S3 compartilhado (opcional, criará um se não fornecido)
+        budget: Orçamento de memória compartilhado (opcional)
         
     Returns:
         True se o pipeline foi executado com sucesso, False caso contrário
     """
+    dirs = get_data_dirs(config)
+    
     try:
         logger.info("=" * 60)
-        logger.info("INICIANDO PIPELINE DE CDC")
+        logger.info(f"INICIANDO PIPELINE DE CDC: {config.get('name', config['dataset_name'])}")
         logger.info("=" * 60)
         
         # Cria diretórios necessários
-        create_directories()
+        create_directories(dirs)
+        
+        # Comparação contra um snapshot retido específico (re-diff)
+        if config.get("base_snapshot"):
+            if not dirs["last"].exists():
+                logger.error(f"Snapshot base não encontrado: {dirs['last']}")
+                return False
+            logger.info(f"Comparando contra o snapshot retido {config['base_snapshot']}")
         
-        # Move snapshots anteriores (se existirem) antes do download
-        if DIR_ACTUAL.exists() and any(DIR_ACTUAL.glob("*.csv")):
-            logger.info("Movendo snapshots existentes para last")
-            move_snapshots()
+        # Promove o snapshot anterior (se existir) antes de baixar um novo
+        elif not skip_download:
+            promote_snapshots(dirs)
         
         # Cria cliente S3 único para reutilização
-        s3_client = get_s3_client()
+        if s3_client is None:
+            s3_client = get_s3_client()
         
-        # 1. Download do dataset
-        if not skip_download:
-            dataset_name = config["dataset_name"]
-            if not download_dataset(dataset_name):
-                logger.error("Falha no download do dataset")
+        # Download, full-load e CDC sobrepostos (asyncio)
+        if config.get("async_io", {}).get("enabled", False):
+            if not asyncio.run(run_tables_async(config, skip_download, s3_client, budget)):
+                logger.error("Falha no pipeline assíncrono")
                 return False
-        else:
-            logger.info("Download pulado (skip_download=True)")
-        
-        # 2. Full-load para S3
-        if not process_full_load(config, s3_client):
-            logger.error("Falha no processo de full-load")
-            return False
         
-        # 3. Geração e upload de CDC
-        if not process_cdc(config, s3_client):
-            logger.error("Falha no processo de CDC")
-            return False
+        else:
+            # 1. Download do dataset
+            if not skip_download:
+                dataset_name = config["dataset_name"]
+                if not download_dataset(dataset_name, dirs):
+                    logger.error("Falha no download do dataset")
+                    return False
+            else:
+                logger.info("Download pulado (skip_download=True)")
+            
+            # 2. Full-load para S3
+            if not process_full_load(config, s3_client, budget):
+                logger.error("Falha no processo de full-load")
+                return False
+            
+            # 3. Geração e upload de CDC
+            if not process_cdc(config, s3_client, budget):
+                logger.error("Falha no processo de CDC")
+                return False
         
         # 4. Limpeza de arquivos CDC locais antigos (se habilitado)
         cleanup_config = config.get("cleanup", {})
         if cleanup_config.get("enabled", True):
             keep_n = cleanup_config.get("keep_last_n_cdc_files", 5)
-            cleanup_local_cdc(keep_last_n=keep_n)
+            # Snapshots primeiro: os CDC preservados dependem dos snapshots que ficaram
+            cleanup_snapshots(keep_last_n=cleanup_config.get("keep_last_n_snapshots", 3), dirs=dirs)
+            cleanup_local_cdc(keep_last_n=keep_n, dirs=dirs)
         
         logger.info("=" * 60)
         logger.info("PIPELINE CONCLUÍDO COM SUCESSO")
@@ -773,6 +3566,57 @@ def run_pipeline(config: Dict, skip_download: bool = False) -> bool:
         return False
 
 
+def run_datasets(config: Dict, skip_download: bool = False) -> bool:
+    """
+    Executa o pipeline de todos os datasets configurados em um único processo.
+    
+    Os datasets compartilham o cliente S3, um pool de workers limitado por
+    'workers.max_concurrency' e o orçamento de memória 'workers.memory_budget_mb'.
+    
+    Args:
+        config: Dicionário de configuração
+        skip_download: Se True, pula o download (útil para testes)
+        
+    Returns:
+        True se todos os datasets foram processados com sucesso, False caso contrário
+    """
+    datasets = expand_datasets(config)
+    workers = config.get("workers", {})
+    max_concurrency = max(1, min(workers.get("max_concurrency", 1), len(datasets)))
+    budget = MemoryBudget(workers.get("memory_budget_mb"))
+    
+    # Pool HTTP dimensionado para uploads paralelos (boto3 usa até 10 threads por arquivo)
+    s3_client = get_s3_client(max_pool_connections=10 * max_concurrency)
+    
+    if len(datasets) == 1:
+        return run_pipeline(datasets[0], skip_download, s3_client, budget)
+    
+    logger.info(
+        f"Executando {len(datasets)} datasets com até {max_concurrency} em paralelo"
+    )
+    
+    def run_dataset(dataset: Dict) -> bool:
+        threading.current_thread().name = dataset["name"]
+        return run_pipeline(dataset, skip_download, s3_client, budget)
+    
+    success = True
+    
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        futures = {executor.submit(run_dataset, d): d["name"] for d in datasets}
+        
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                if not future.result():
+                    logger.warning(f"Dataset {name} concluído com erros")
+                    success = False
+            except Exception as e:
+                logger.error(f"Erro fatal no dataset {name}: {e}", exc_info=True)
+                success = False
+    
+    return success
+
+
 # ==================== AGENDADOR ====================
 
 def calculate_sleep_seconds(timer_config: Dict) -> int:
@@ -825,7 +3669,7 @@ def run_scheduler(config: Dict):
             logger.info(f"{'=' * 60}\n")
             
             # Executa o pipeline
-            success = run_pipeline(config)
+            success = run_datasets(config)
             
             if not success:
                 logger.warning(f"Iteração {iteration} concluída com erros")
@@ -852,6 +3696,52 @@ def run_scheduler(config: Dict):
 
 # ==================== MAIN ====================
 
+def run_catalog_command(config: Dict, args: argparse.Namespace) -> bool:
+    """
+    Executa os comandos de consulta ao catálogo de CDC (--rebuild / --history).
+    
+    Args:
+        config: Dicionário de configuração
+        args: Argumentos de linha de comando
+        
+    Returns:
+        True se o comando foi executado com sucesso, False caso contrário
+    """
+    datasets = expand_datasets(config)
+    if args.dataset:
+        datasets = [d for d in datasets if d["name"] == args.dataset]
+    if len(datasets) != 1:
+        logger.error("Informe --dataset com um dos nomes configurados em 'datasets'")
+        return False
+    
+    catalog_path = get_data_dirs(datasets[0])["catalog"]
+    if not catalog_path.exists():
+        logger.error(f"Catálogo de CDC não encontrado: {catalog_path}")
+        return False
+    
+    if args.history:
+        if args.pk is None:
+            logger.error("--history requer --pk")
+            return False
+        df = get_pk_history(catalog_path, args.history, args.pk)
+        if df.empty:
+            logger.info(f"Nenhuma operação encontrada para {args.history} PK={args.pk}")
+    else:
+        pks = [args.pk] if args.pk is not None else None
+        table = next((t for t in datasets[0]["tables"] if t["name"] == args.rebuild), {})
+        df = rebuild_table(catalog_path, args.rebuild, args.as_of, pks, table.get("sep", ";"))
+        if df is None:
+            return False
+    
+    if args.output:
+        df.to_parquet(args.output, index=False, engine='pyarrow')
+        logger.info(f"Resultado gravado em {args.output} ({len(df)} linha(s))")
+    else:
+        print(df.to_string(index=False))
+    
+    return True
+
+
 def main():
     """
     Função principal com suporte a argumentos de linha de comando.
@@ -869,6 +3759,29 @@ def main():
         action="store_true",
         help="Pula o download do Kaggle (útil para testes com dados locais)"
     )
+    parser.add_argument(
+        "--base-snapshot",
+        help="Gera o CDC contra um snapshot retido em data/snapshots/<run_id> em vez do último"
+    )
+    parser.add_argument(
+        "--rebuild",
+        metavar="TABELA",
+        help="Reconstrói a tabela a partir do catálogo de CDC (use com --as-of, --pk, --output)"
+    )
+    parser.add_argument(
+        "--history",
+        metavar="TABELA",
+        help="Mostra o histórico de operações de uma PK da tabela (use com --pk)"
+    )
+    parser.add_argument("--pk", help="Valor da chave primária para --history/--rebuild")
+    parser.add_argument("--as-of", help="run_id até o qual o CDC é reaplicado em --rebuild")
+    parser.add_argument("--output", help="Arquivo Parquet de saída para --rebuild/--history")
+    parser.add_argument("--dataset", help="Nome do dataset (configurações com 'datasets')")
+    parser.add_argument(
+        "--plan",
+        action="store_true",
+        help="Mostra o que o ciclo faria (volumes de I/U/D, tamanhos e tempo de upload) sem gravar nada"
+    )
     parser.add_argument(
         "--config",
         default="config.json",
@@ -877,9 +3790,24 @@ def main():
     
     args = parser.parse_args()
     
+    setup_logging()
+    
     try:
         # Carrega configuração
         config = load_config(args.config)
+        if "logging" in config:
+            setup_logging(config["logging"])
+        
+        # Consultas ao catálogo não precisam de credenciais
+        if args.rebuild or args.history:
+            sys.exit(0 if run_catalog_command(config, args) else 1)
+        
+        if args.base_snapshot:
+            config["base_snapshot"] = args.base_snapshot
+        
+        # Plano de execução: só leitura, não precisa de credenciais
+        if args.plan:
+            sys.exit(0 if run_plan(config, args.dataset) else 1)
         
         # Valida configuração
         if not validate_config(config):
@@ -889,7 +3817,7 @@ def main():
         # Executa pipeline
         if args.once:
             logger.info("MODO EXECUÇÃO ÚNICA")
-            success = run_pipeline(config, skip_download=args.skip_download)
+            success = run_datasets(config, skip_download=args.skip_download)
             sys.exit(0 if success else 1)
         else:
             run_scheduler(config)